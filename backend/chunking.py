@@ -3,11 +3,107 @@ Chunking Module - Splits extracted pages into semantically coherent chunks
 Preserves metadata (page, section, document name)
 """
 import re
-from typing import List, Dict
+from functools import lru_cache
+from typing import List, Dict, Tuple
 from dataclasses import dataclass
+import numpy as np
 from ingest_pdf import PageContent
 import config
 
+try:
+    from numba import njit as _njit
+except ImportError:  # numba is optional; the planner runs as plain Python
+    _njit = None
+
+
+# tiktoken encoding, loaded on first use (False if unavailable)
+_ENC = None
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """
+    Count tokens with the cl100k_base BPE, falling back to the
+    1 token ≈ 4 chars approximation if tiktoken can't be loaded
+    
+    Args:
+        text: Input text
+    
+    Returns:
+        Token count
+    """
+    global _ENC
+    if _ENC is None:
+        try:
+            import tiktoken
+            _ENC = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _ENC = False
+    
+    if not _ENC:
+        return len(text) >> 2
+    return len(_ENC.encode(text, disallowed_special=()))
+
+
+def _plan_chunk_boundaries(fragment_tokens, unit_starts, unit_tokens, unit_flush,
+                           chunk_size, overlap):
+    """
+    Plan chunk boundaries over a page's fragments
+    Units are added to the current chunk whole; a unit that would push the
+    chunk past chunk_size closes it, and the trailing fragments that fit in
+    the overlap budget seed the next one. Flagged units close the current
+    chunk without overlap
+    
+    Args:
+        fragment_tokens: Token count of each fragment
+        unit_starts: Index of each unit's first fragment, plus a final end index
+        unit_tokens: Token count of each unit
+        unit_flush: Whether each unit starts a new chunk without overlap
+        chunk_size: Target chunk size in tokens
+        overlap: Overlap between chunks in tokens
+    
+    Returns:
+        List of (start, end) fragment ranges, one per chunk
+    """
+    boundaries = []
+    start = 0
+    end = 0
+    current_tokens = 0
+    
+    for unit in range(len(unit_tokens)):
+        if unit_flush[unit] and end > start:
+            boundaries.append((start, end))
+            start = end
+            current_tokens = 0
+        
+        if current_tokens + unit_tokens[unit] > chunk_size and end > start:
+            boundaries.append((start, end))
+            
+            # Walk back over the trailing fragments that fit in the overlap
+            overlap_tokens = 0
+            next_start = end
+            while next_start > start and overlap_tokens + fragment_tokens[next_start - 1] <= overlap:
+                next_start -= 1
+                overlap_tokens += fragment_tokens[next_start]
+            
+            start = next_start
+            current_tokens = overlap_tokens
+        
+        end = unit_starts[unit + 1]
+        current_tokens += unit_tokens[unit]
+    
+    if end > start:
+        boundaries.append((start, end))
+    
+    return boundaries
+
+
+# Compiled with numba when it is installed (large corpora), plain Python otherwise
+plan_chunk_boundaries = (
+    _njit(cache=True)(_plan_chunk_boundaries) if _njit is not None
+    else _plan_chunk_boundaries
+)
+
 
 @dataclass
 class Chunk:
@@ -23,6 +119,10 @@ class SmartChunker:
     Ensures chunks are sized appropriately for embedding models
     """
     
+    # Pre-compiled split patterns (sentence and paragraph boundaries)
+    _SENT_RE = re.compile(r'(?<=[.!?])\s+')
+    _PARA_RE = re.compile(r'\n\s*\n')
+    
     def __init__(self, chunk_size: int = config.CHUNK_SIZE, 
                  overlap: int = config.CHUNK_OVERLAP):
         """
@@ -37,7 +137,9 @@ class SmartChunker:
     
     def estimate_tokens(self, text: str) -> int:
         """
-        Estimate token count (rough approximation: 1 token ≈ 4 chars)
+        Estimate token count (see count_tokens)
+        Chunk boundaries compare sums of these counts, so every fragment and
+        unit is measured with this one function
         
         Args:
             text: Input text
@@ -45,7 +147,7 @@ class SmartChunker:
         Returns:
             Estimated token count
         """
-        return len(text) // 4
+        return count_tokens(text)
     
     def split_by_sentences(self, text: str) -> List[str]:
         """
@@ -58,7 +160,7 @@ class SmartChunker:
             List of sentences
         """
         # Split on sentence boundaries
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        sentences = self._SENT_RE.split(text)
         return [s.strip() for s in sentences if s.strip()]
     
     def split_by_paragraphs(self, text: str) -> List[str]:
@@ -71,7 +173,7 @@ class SmartChunker:
         Returns:
             List of paragraphs
         """
-        paragraphs = re.split(r'\n\s*\n', text)
+        paragraphs = self._PARA_RE.split(text)
         return [p.strip() for p in paragraphs if p.strip()]
     
     def create_chunks_from_page(self, page: PageContent) -> List[Chunk]:
@@ -84,102 +186,91 @@ class SmartChunker:
         Returns:
             List of Chunk objects
         """
-        chunks = []
-        
         # Split into paragraphs first
         paragraphs = self.split_by_paragraphs(page.text)
         
-        current_chunk = ""
-        current_tokens = 0
+        # Flatten the page into fragments (text carrying its leading
+        # separator, plus its tokens) grouped into units that are added to a
+        # chunk as a whole; the boundary planner only sees the integer arrays
+        texts = []
+        fragment_tokens = []
+        unit_starts = []
+        unit_tokens = []
+        unit_flush = []
         
         for para in paragraphs:
-            para_tokens = self.estimate_tokens(para)
+            # Counted as the sum of its sentences, the units the overlap takes
+            fragments = self._sentence_fragments(para, "\n\n")
+            para_tokens = sum(tokens for _, tokens in fragments)
             
-            # If paragraph alone exceeds chunk size, split by sentences
+            # If paragraph alone exceeds chunk size, split by sentences; the
+            # current chunk is saved first and each sentence is its own unit
             if para_tokens > self.chunk_size:
-                # Save current chunk if not empty
-                if current_chunk:
-                    chunks.append(self._create_chunk(
-                        current_chunk, page, len(chunks)
-                    ))
-                    current_chunk = ""
-                    current_tokens = 0
-                
-                # Split large paragraph
-                sentences = self.split_by_sentences(para)
-                for sentence in sentences:
+                flush = True
+                for sentence in self.split_by_sentences(para):
                     sent_tokens = self.estimate_tokens(sentence)
-                    
-                    if current_tokens + sent_tokens > self.chunk_size:
-                        if current_chunk:
-                            chunks.append(self._create_chunk(
-                                current_chunk, page, len(chunks)
-                            ))
-                            # Overlap: keep last portion
-                            overlap_text = self._get_overlap(current_chunk)
-                            current_chunk = overlap_text + " " + sentence
-                            current_tokens = self.estimate_tokens(current_chunk)
-                        else:
-                            current_chunk = sentence
-                            current_tokens = sent_tokens
-                    else:
-                        current_chunk += " " + sentence
-                        current_tokens += sent_tokens
+                    unit_starts.append(len(texts))
+                    unit_tokens.append(sent_tokens)
+                    unit_flush.append(flush)
+                    texts.append(" " + sentence)
+                    fragment_tokens.append(sent_tokens)
+                    flush = False
             else:
-                # Check if adding this paragraph exceeds chunk size
-                if current_tokens + para_tokens > self.chunk_size:
-                    # Save current chunk
-                    if current_chunk:
-                        chunks.append(self._create_chunk(
-                            current_chunk, page, len(chunks)
-                        ))
-                        # Overlap: keep last portion
-                        overlap_text = self._get_overlap(current_chunk)
-                        current_chunk = overlap_text + "\n\n" + para
-                        current_tokens = self.estimate_tokens(current_chunk)
-                    else:
-                        current_chunk = para
-                        current_tokens = para_tokens
-                else:
-                    if current_chunk:
-                        current_chunk += "\n\n" + para
-                    else:
-                        current_chunk = para
-                    current_tokens += para_tokens
+                # Keep the paragraph whole, but store it sentence by sentence
+                # so a later overlap can take its tail without re-splitting
+                unit_starts.append(len(texts))
+                unit_tokens.append(para_tokens)
+                unit_flush.append(False)
+                for text, tokens in fragments:
+                    texts.append(text)
+                    fragment_tokens.append(tokens)
+        
+        unit_starts.append(len(texts))
         
-        # Don't forget the last chunk
-        if current_chunk:
-            chunks.append(self._create_chunk(
-                current_chunk, page, len(chunks)
-            ))
+        if _njit is not None:
+            boundaries = plan_chunk_boundaries(
+                np.asarray(fragment_tokens, dtype=np.int64),
+                np.asarray(unit_starts, dtype=np.int64),
+                np.asarray(unit_tokens, dtype=np.int64),
+                np.asarray(unit_flush, dtype=np.bool_),
+                self.chunk_size,
+                self.overlap
+            )
+        else:
+            boundaries = plan_chunk_boundaries(
+                fragment_tokens, unit_starts, unit_tokens, unit_flush,
+                self.chunk_size, self.overlap
+            )
         
-        return chunks
+        return [
+            self._create_chunk("".join(texts[start:end]), page, index)
+            for index, (start, end) in enumerate(boundaries)
+        ]
     
-    def _get_overlap(self, text: str) -> str:
+    def _sentence_fragments(self, text: str, separator: str) -> List[Tuple[str, int]]:
         """
-        Get overlap portion from end of text
+        Split text into sentence fragments that keep their original separators
         
         Args:
-            text: Input text
+            text: Input text (stripped)
+            separator: Separator to prepend to the first fragment
         
         Returns:
-            Overlap text
+            List of (text, tokens) fragments; joined, they reproduce separator + text
         """
-        sentences = self.split_by_sentences(text)
+        fragments = []
+        start = 0
         
-        overlap_text = ""
-        overlap_tokens = 0
+        for match in self._SENT_RE.finditer(text):
+            sentence = text[start:match.start()]
+            fragments.append((separator + sentence, self.estimate_tokens(sentence)))
+            separator = match.group()
+            start = match.end()
         
-        # Take last few sentences for overlap
-        for sentence in reversed(sentences):
-            sent_tokens = self.estimate_tokens(sentence)
-            if overlap_tokens + sent_tokens <= self.overlap:
-                overlap_text = sentence + " " + overlap_text
-                overlap_tokens += sent_tokens
-            else:
-                break
+        sentence = text[start:]
+        fragments.append((separator + sentence, self.estimate_tokens(sentence)))
         
-        return overlap_text.strip()
+        return fragments
     
     def _create_chunk(self, text: str, page: PageContent, chunk_index: int) -> Chunk:
         """
@@ -12,8 +12,16 @@ LLM_TEMPERATURE = 0.2
 LLM_MAX_TOKENS = 512
 LLM_TOP_P = 0.9
 
+# Response Caching
+LLM_CACHE_SIZE = 512  # exact-match completions kept per client
+ANSWER_CACHE_SIZE = 256  # prior answers kept per document for repeated questions
+
 # Embedding Model
 EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBEDDING_DEVICE = None  # None picks cuda, then mps, then cpu
+EMBEDDING_BACKEND = "torch"  # or "onnx": int8 ONNX Runtime on CPU (needs optimum[onnxruntime])
+FAISS_OMP_THREADS = max(2, (os.cpu_count() or 2) // 2)  # threads per FAISS search
+SHOW_PROGRESS = os.environ.get("SHOW_PROGRESS", "1") == "1"  # embedding progress bar (terminals only)
 
 # Chunking Parameters
 CHUNK_SIZE = 600  # tokens (roughly 400-700 words)
@@ -21,14 +29,32 @@ CHUNK_OVERLAP = 100  # tokens
 
 # Retrieval Parameters
 TOP_K_CHUNKS = 4  # Balanced for 4096 token context with optimized prompts
-SIMILARITY_THRESHOLD = 0.3
+SIMILARITY_THRESHOLD = 0.0  # cosine; the old 0.3 on 1/(1+L2²) admitted cos >= -0.17
+CONTEXT_TOKEN_BUDGET = 2400  # max tokens of retrieved context sent to the LLM
+
+# Vector Index
+ANN_MIN_VECTORS = 20000  # below this, flat int8 (SQ8) search; above, IVF-PQ FastScan
+SQ8_RERANK_FACTOR = 4  # SQ8 candidates per result, re-ranked exactly
+ANN_NPROBE = 16  # IVF lists scanned per query
+ANN_RERANK_FACTOR = 10  # approximate candidates per result, re-ranked exactly
+RERANK_CANDIDATES = 20  # FAISS candidates per result re-ranked by search_rerank
+SEARCH_BATCH_SIZE = 32  # concurrent chat queries searched in one batch
+QUERY_CACHE_SIZE = 512  # search hits kept per document for repeated queries
 
 # Memory Settings
 MAX_HISTORY_MESSAGES = 5
 
+# Document Cache
+MAX_LOADED_DOCUMENTS = 32  # vector stores kept in memory; others reload from disk
+
+# Background Ingestion
+INGEST_WORKERS = 2  # processes used to ingest uploaded PDFs
+CHAT_WORKERS = 4  # threads used for chat embedding/search
+
 # File Paths
 UPLOAD_DIR = "uploads"
 VECTOR_STORE_DIR = "vector_stores"
+ONNX_MODEL_DIR = "onnx_models"  # exported/quantized embedding models
 
 # Ensure directories exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
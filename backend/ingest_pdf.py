@@ -4,9 +4,18 @@ Preserves page numbers, section headings, and structure
 """
 import re
 import fitz  # PyMuPDF
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Set, Tuple
 from dataclasses import dataclass
 
+try:
+    import hyperscan  # Optional multi-pattern prefilter (not available on Windows)
+except ImportError:
+    hyperscan = None
+
+# Pattern ids for the hyperscan page prefilter
+_HS_SECTION = 0
+_HS_BLANK_RUN = 1
+
 
 @dataclass
 class PageContent:
@@ -27,6 +36,16 @@ class PDFIngestor:
     # Regex pattern for FDA section headings (e.g., "1.4", "2.6", "5.1")
     SECTION_PATTERN = re.compile(r'^\s*(\d+\.?\d*)\s+([A-Z][A-Za-z\s,&\(\)]+)', re.MULTILINE)
     
+    # Runs of 3+ newlines (with optional whitespace) collapsed during cleanup
+    _BLANK_RE = re.compile(r'\n\s*\n\s*\n')
+    
+    # Fewest vector drawings (ruling lines, cell borders) a page needs
+    # before find_tables() is worth running
+    _MIN_TABLE_DRAWINGS = 20
+    
+    # Hyperscan database for the page prefilter, compiled on first use
+    _hs_db = None
+    
     def __init__(self, pdf_path: str):
         """
         Initialize PDF ingestor
@@ -37,6 +56,7 @@ class PDFIngestor:
         self.pdf_path = pdf_path
         self.document_name = pdf_path.split('/')[-1].split('\\')[-1]
         self.doc = None
+        self._hs_scratch = None  # hyperscan scratch space, allocated on first scan
     
     def open(self):
         """Open the PDF document"""
@@ -67,41 +87,92 @@ class PDFIngestor:
             List of section headings found on the page
         """
         sections = []
-        matches = self.SECTION_PATTERN.finditer(text)
         
-        for match in matches:
+        for match in self.SECTION_PATTERN.finditer(text):
             section_num = match.group(1)
             section_title = match.group(2).strip()
             sections.append(f"{section_num} {section_title}")
         
         return sections
     
-    def detect_table(self, page) -> bool:
+    def detect_table(self, page, text: Optional[str] = None) -> bool:
         """
         Detect if page contains tables
         
         Args:
             page: PyMuPDF page object
+            text: Raw page text already extracted by the caller (avoids re-parsing)
         
         Returns:
             True if table detected, False otherwise
         """
         # Check for table-like structures (multiple tabs, structured spacing)
-        text = page.get_text()
+        if text is None:
+            text = page.get_text()
         
         # Simple heuristic: multiple tab characters or aligned columns
         tab_count = text.count('\t')
         if tab_count > 10:
             return True
         
-        # Check for PyMuPDF table detection
+        # find_tables() runs a full layout analysis and finds tables from
+        # their ruling lines, so skip it on pages with almost no vector
+        # drawings (narrative pages) where it cannot find anything
         try:
+            if len(page.get_drawings()) < self._MIN_TABLE_DRAWINGS:
+                return False
+            
+            # Check for PyMuPDF table detection
             tables = page.find_tables()
             # TableFinder object needs to be converted to list
             return tables is not None and len(tables.tables) > 0
         except:
             return False
     
+    @classmethod
+    def _get_hs_db(cls):
+        """Compile the hyperscan database of per-page patterns (once)"""
+        if cls._hs_db is None:
+            db = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+            flags = hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH
+            db.compile(
+                expressions=[
+                    cls.SECTION_PATTERN.pattern.encode('utf-8'),
+                    cls._BLANK_RE.pattern.encode('utf-8'),
+                ],
+                ids=[_HS_SECTION, _HS_BLANK_RUN],
+                flags=[flags | hyperscan.HS_FLAG_MULTILINE, flags],
+            )
+            cls._hs_db = db
+        return cls._hs_db
+    
+    def _scan_page(self, text: str) -> Optional[Set[int]]:
+        """
+        Find which per-page patterns occur in the text in a single
+        hyperscan pass, so the corresponding re passes can be skipped
+        on pages where they cannot match
+        
+        Args:
+            text: Page text
+        
+        Returns:
+            Set of matched pattern ids, or None if hyperscan is unavailable
+        """
+        if hyperscan is None:
+            return None
+        
+        db = self._get_hs_db()
+        if self._hs_scratch is None:
+            self._hs_scratch = hyperscan.Scratch(db)
+        
+        found = set()
+        
+        def on_match(pattern_id, start, end, flags, context):
+            found.add(pattern_id)
+        
+        db.scan(text.encode('utf-8'), match_event_handler=on_match, scratch=self._hs_scratch)
+        return found
+    
     def extract_page(self, page_num: int) -> PageContent:
         """
         Extract content from a single page
@@ -117,14 +188,22 @@ class PDFIngestor:
         # Extract text
         text = page.get_text("text")
         
+        # Detect tables (on the raw text: cleanup collapses whitespace runs,
+        # which would drop tabs the heuristic counts)
+        has_table = self.detect_table(page, text)
+        
+        # Prefilter: which patterns can match on this page (None = unknown)
+        found = self._scan_page(text)
+        
         # Clean up text (remove excessive whitespace, but preserve structure)
-        text = re.sub(r'\n\s*\n\s*\n', '\n\n', text)  # Max 2 consecutive newlines
+        if found is None or _HS_BLANK_RUN in found:
+            text = self._BLANK_RE.sub('\n\n', text)  # Max 2 consecutive newlines
         
         # Extract sections
-        sections = self.extract_sections(text)
-        
-        # Detect tables
-        has_table = self.detect_table(page)
+        if found is None or _HS_SECTION in found:
+            sections = self.extract_sections(text)
+        else:
+            sections = []
         
         return PageContent(
             page_number=page_num + 1,  # 1-indexed for user display
@@ -141,13 +220,10 @@ class PDFIngestor:
         Returns:
             List of PageContent objects
         """
-        pages = []
-        
-        for page_num in range(len(self.doc)):
-            page_content = self.extract_page(page_num)
-            pages.append(page_content)
-        
-        return pages
+        # Sequential on purpose: PyMuPDF holds the GIL, and uploads are
+        # already ingested in separate worker processes
+        page_count = len(self.doc)
+        return [self.extract_page(page_num) for page_num in range(page_count)]
     
     def get_page_count(self) -> int:
         """Get total number of pages"""
@@ -2,10 +2,42 @@
 LLM Client Module - Interfaces with LM Studio local inference
 Handles API calls and response formatting
 """
-from typing import List, Dict, Optional
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+import httpx
+import orjson
 import requests
 import config
 
+logger = logging.getLogger("medquery.llm")
+
+# Assistant turn acknowledging the system prompt (see _build_messages)
+SYSTEM_PROMPT_ACK = "Understood."
+
+# Connection pool for the shared async client
+ASYNC_CLIENT_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+
+
+def create_async_http_client(base_url: str = config.LM_STUDIO_BASE_URL) -> httpx.AsyncClient:
+    """
+    Create a pooled httpx.AsyncClient for the LM Studio API
+    
+    Args:
+        base_url: LM Studio API endpoint
+    
+    Returns:
+        AsyncClient that keeps connections alive across requests
+    """
+    return httpx.AsyncClient(
+        base_url=base_url.rstrip('/'),
+        headers={"Content-Type": "application/json"},
+        limits=ASYNC_CLIENT_LIMITS,
+        timeout=120
+    )
+
 
 class LMStudioClient:
     """
@@ -34,6 +66,73 @@ class LMStudioClient:
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.top_p = top_p
+        
+        # Persistent session so requests reuse keep-alive connections
+        self._session = requests.Session()
+        self._session.headers.update({"Content-Type": "application/json"})
+        
+        # Shared async client for the API server (see start_async_client)
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._owns_async_client = False
+        
+        # Exact-match completion cache (serialized payload -> response text),
+        # shared by the sync and async paths
+        self._response_cache = OrderedDict()
+        self._response_cache_lock = threading.Lock()
+    
+    def _cache_key(self, payload: Dict) -> bytes:
+        """Canonical cache key for a request payload"""
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    
+    def _cache_get(self, key: bytes) -> Optional[str]:
+        """Look up a cached completion, refreshing its LRU position"""
+        with self._response_cache_lock:
+            if key in self._response_cache:
+                self._response_cache.move_to_end(key)
+                return self._response_cache[key]
+        return None
+    
+    def _cache_put(self, key: bytes, content: str):
+        """Store a completion, evicting the least recently used entry if full"""
+        with self._response_cache_lock:
+            self._response_cache[key] = content
+            self._response_cache.move_to_end(key)
+            if len(self._response_cache) > config.LLM_CACHE_SIZE:
+                self._response_cache.popitem(last=False)
+    
+    def start_async_client(self, client: Optional[httpx.AsyncClient] = None):
+        """
+        Set up the shared httpx.AsyncClient used by async completions
+        
+        Args:
+            client: Client to use (its owner closes it); one is created if None
+        """
+        if client is not None:
+            self._async_client = client
+            self._owns_async_client = False
+        elif self._async_client is None:
+            self._async_client = create_async_http_client(self.base_url)
+            self._owns_async_client = True
+    
+    async def aclose(self):
+        """Release the shared async client (closing it if this client created it)"""
+        if self._async_client is not None:
+            if self._owns_async_client:
+                await self._async_client.aclose()
+            self._async_client = None
+    
+    def _build_payload(self,
+                       messages: List[Dict[str, str]],
+                       temperature: Optional[float] = None,
+                       max_tokens: Optional[int] = None) -> Dict:
+        """Build the chat completions request body"""
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature or self.temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+            "top_p": self.top_p
+        }
     
     def chat_completion(self, 
                        messages: List[Dict[str, str]],
@@ -53,39 +152,163 @@ class LMStudioClient:
         try:
             # Make direct HTTP request to LM Studio
             url = f"{self.base_url}/chat/completions"
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "temperature": temperature or self.temperature,
-                "max_tokens": max_tokens or self.max_tokens,
-                "top_p": self.top_p
-            }
+            payload = self._build_payload(messages, temperature, max_tokens)
+            
+            cache_key = self._cache_key(payload)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                logger.debug("LM Studio response served from cache")
+                return cached
             
-            print(f"Sending request to LM Studio: {url}")
-            print(f"Model: {self.model}")
-            print(f"Messages count: {len(messages)}")
+            logger.debug("Sending request to LM Studio: %s (model %s, %d messages)",
+                         url, self.model, len(messages))
             
-            response = requests.post(url, json=payload, timeout=120)
+            response = self._session.post(url, data=orjson.dumps(payload), timeout=120)
             
             # Log response for debugging
-            print(f"Response status: {response.status_code}")
+            logger.debug("Response status: %d", response.status_code)
             if response.status_code != 200:
-                print(f"Error response: {response.text}")
+                logger.error("Error response: %s", response.text)
             
             response.raise_for_status()
             
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
+            result = orjson.loads(response.content)
+            content = result["choices"][0]["message"]["content"]
+            self._cache_put(cache_key, content)
+            return content
+        
+        except requests.exceptions.RequestException as e:
+            error_msg = f"Error calling LM Studio: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        except (KeyError, IndexError, ValueError) as e:
+            error_msg = f"Invalid response from LM Studio: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+    
+    def stream_chat_completion(self,
+                               messages: List[Dict[str, str]],
+                               temperature: Optional[float] = None,
+                               max_tokens: Optional[int] = None) -> Iterator[str]:
+        """
+        Generate chat completion as a stream of content deltas
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            temperature: Override default temperature
+            max_tokens: Override default max_tokens
+        
+        Yields:
+            Text deltas as LM Studio produces them
+        """
+        try:
+            url = f"{self.base_url}/chat/completions"
+            payload = {**self._build_payload(messages, temperature, max_tokens), "stream": True}
+            
+            logger.debug("Sending streaming request to LM Studio: %s", url)
+            
+            with self._session.post(url, data=orjson.dumps(payload), timeout=120, stream=True) as response:
+                if response.status_code != 200:
+                    logger.error("Error response: %s", response.text)
+                response.raise_for_status()
+                
+                # SSE frames are UTF-8 regardless of the declared charset
+                response.encoding = "utf-8"
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    delta = orjson.loads(data)["choices"][0].get("delta", {}).get("content")
+                    if delta:
+                        yield delta
         
         except requests.exceptions.RequestException as e:
             error_msg = f"Error calling LM Studio: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        except (KeyError, IndexError, ValueError) as e:
+            error_msg = f"Invalid response from LM Studio: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+    
+    async def chat_completion_async(self,
+                                    messages: List[Dict[str, str]],
+                                    temperature: Optional[float] = None,
+                                    max_tokens: Optional[int] = None) -> str:
+        """
+        Generate chat completion without blocking the event loop
+        
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            temperature: Override default temperature
+            max_tokens: Override default max_tokens
+        
+        Returns:
+            Generated text response
+        """
+        self.start_async_client()
+        
+        try:
+            payload = self._build_payload(messages, temperature, max_tokens)
+            
+            cache_key = self._cache_key(payload)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                logger.debug("LM Studio response served from cache")
+                return cached
+            
+            logger.debug("Sending async request to LM Studio: %s/chat/completions", self.base_url)
+            
+            response = await self._async_client.post("/chat/completions", content=orjson.dumps(payload))
+            
+            logger.debug("Response status: %d", response.status_code)
+            if response.status_code != 200:
+                logger.error("Error response: %s", response.text)
+            
+            response.raise_for_status()
+            
+            result = orjson.loads(response.content)
+            content = result["choices"][0]["message"]["content"]
+            self._cache_put(cache_key, content)
+            return content
+        
+        except httpx.HTTPError as e:
+            error_msg = f"Error calling LM Studio: {str(e)}"
+            logger.error(error_msg)
             raise Exception(error_msg)
-        except (KeyError, IndexError) as e:
+        except (KeyError, IndexError, ValueError) as e:
             error_msg = f"Invalid response from LM Studio: {str(e)}"
-            print(error_msg)
+            logger.error(error_msg)
             raise Exception(error_msg)
     
+    def _build_messages(self,
+                        system_prompt: str,
+                        user_prompt: str,
+                        conversation_history: Optional[List[Dict]] = None) -> List[Dict]:
+        """
+        Assemble the message list for a prompt (see generate_answer)
+        
+        LM Studio Mistral doesn't support the system role, so the system prompt
+        is sent as an opening user/assistant exchange. Keeping it first and
+        byte-identical across calls lets the server reuse its KV cache for
+        that prefix instead of re-processing it every turn.
+        """
+        messages = [
+            {"role": "user", "content": system_prompt},
+            {"role": "assistant", "content": SYSTEM_PROMPT_ACK},
+        ]
+        
+        # Add conversation history if provided
+        if conversation_history:
+            messages.extend(conversation_history)
+        
+        messages.append({"role": "user", "content": user_prompt})
+        
+        return messages
+    
     def generate_answer(self, 
                        system_prompt: str,
                        user_prompt: str,
@@ -101,22 +324,49 @@ class LMStudioClient:
         Returns:
             Generated answer
         """
-        messages = []
+        messages = self._build_messages(system_prompt, user_prompt, conversation_history)
+        return self.chat_completion(messages)
+    
+    def stream_answer(self,
+                      system_prompt: str,
+                      user_prompt: str,
+                      conversation_history: Optional[List[Dict]] = None) -> Iterator[str]:
+        """
+        Streaming variant of generate_answer
         
-        # Add conversation history if provided
-        if conversation_history:
-            messages.extend(conversation_history)
+        Args:
+            system_prompt: System instruction
+            user_prompt: User query with context
+            conversation_history: Optional conversation history
         
-        # Combine system prompt with user prompt since LM Studio Mistral doesn't support system role
-        # Put system instructions at the beginning of the user message
-        combined_prompt = f"{system_prompt}\n\n{user_prompt}"
-        messages.append({"role": "user", "content": combined_prompt})
+        Yields:
+            Text deltas of the generated answer
+        """
+        messages = self._build_messages(system_prompt, user_prompt, conversation_history)
+        return self.stream_chat_completion(messages)
+    
+    async def generate_answer_async(self,
+                                    system_prompt: str,
+                                    user_prompt: str,
+                                    conversation_history: Optional[List[Dict]] = None) -> str:
+        """
+        Async variant of generate_answer
         
-        return self.chat_completion(messages)
+        Args:
+            system_prompt: System instruction
+            user_prompt: User query with context
+            conversation_history: Optional conversation history
+        
+        Returns:
+            Generated answer
+        """
+        messages = self._build_messages(system_prompt, user_prompt, conversation_history)
+        return await self.chat_completion_async(messages)
 
 
 # Global client instance
 _client = None
+_client_lock = threading.Lock()
 
 
 def get_llm_client() -> LMStudioClient:
@@ -128,7 +378,9 @@ def get_llm_client() -> LMStudioClient:
     """
     global _client
     if _client is None:
-        _client = LMStudioClient()
+        with _client_lock:
+            if _client is None:
+                _client = LMStudioClient()
     return _client
 
 
@@ -143,10 +395,33 @@ def test_connection() -> bool:
         client = get_llm_client()
         # Test with actual API call to /v1/models endpoint
         url = f"{client.base_url}/models"
-        response = requests.get(url, timeout=5)
+        response = client._session.get(url, timeout=5)
+        return response.status_code == 200
+    except Exception as e:
+        logger.warning("Connection test failed: %s", e)
+        return False
+
+
+async def test_connection_async(http_client: Optional[httpx.AsyncClient] = None) -> bool:
+    """
+    Test connection to LM Studio over a shared async client
+    
+    Args:
+        http_client: Client to probe with (defaults to the LLM client's)
+    
+    Returns:
+        True if connection successful, False otherwise
+    """
+    if http_client is None:
+        http_client = get_llm_client()._async_client
+    if http_client is None:
+        return await asyncio.get_running_loop().run_in_executor(None, test_connection)
+    
+    try:
+        response = await http_client.get("/models", timeout=5)
         return response.status_code == 200
     except Exception as e:
-        print(f"Connection test failed: {e}")
+        logger.warning("Connection test failed: %s", e)
         return False
 
 
@@ -2,33 +2,51 @@
 Main FastAPI Application - Drug Information Chatbot Backend
 Provides REST API for PDF upload, ingestion, and querying
 """
+import io
 import os
+import sys
+import logging
+import logging.handlers
 import uuid
-import shutil
-import json
 import hashlib
+import asyncio
+import multiprocessing
+import threading
+import time
+import orjson
+import cachetools
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from operator import itemgetter
 from typing import Optional, List
-from fastapi import FastAPI, File, UploadFile, HTTPException, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Body, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from datetime import datetime
 
 # Import our modules
-from ingest_pdf import ingest_pdf
-from chunking import chunk_pages
-from vectorstore import VectorStore, create_vector_store
+from vectorstore import VectorStore, build_document_store, get_embedding_model, init_ingest_worker
 from memory import ConversationMemory, get_memory
 from retrieval import RAGRetriever, create_retriever
-from llm_client import test_connection
+from llm_client import get_llm_client, create_async_http_client, test_connection_async
 import config
 
+logger = logging.getLogger("medquery")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Drug Information Chatbot API",
     description="Regulatory-grade chatbot for FDA prescribing information PDFs",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Latest background LM Studio probe (see monitor_lm_studio)
+app.state.lm_status = {"ok": False, "ts": 0.0}
+
+# Serialized GET /documents body; reset whenever metadata changes
+app.state.documents_cache_json = None
+
 # CORS configuration
 app.add_middleware(
     CORSMiddleware,
@@ -38,86 +56,361 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+class VectorStoreCache(cachetools.LRUCache):
+    """
+    LRU of loaded vector stores
+    Evicting a store also drops its retriever so its memory can be reclaimed;
+    evicted documents are reloaded from disk on next use (see get_retriever)
+    """
+    
+    def popitem(self):
+        document_id, store = super().popitem()
+        retrievers.pop(document_id, None)
+        logger.info("Unloaded vector store for document %s", document_id)
+        return document_id, store
+
+
 # Global state
-vector_stores = {}  # document_id -> VectorStore
-retrievers = {}     # document_id -> RAGRetriever
+vector_stores = VectorStoreCache(maxsize=config.MAX_LOADED_DOCUMENTS)  # document_id -> VectorStore
+retrievers = {}     # document_id -> RAGRetriever (only for stores in vector_stores)
+store_lock = threading.Lock()  # guards loading into vector_stores/retrievers
 memory = get_memory()
-documents_metadata = {}  # document_id -> {filename, hash, upload_date, page_count, chunk_count}
+# document_id -> {filename, hash, upload_date, page_count, chunk_count}
+# Change it only together with save_metadata()/load_metadata(): they reset
+# the cached /documents body (app.state.documents_cache_json)
+documents_metadata = {}
+jobs = {}  # document_id -> {status, filename, hash, page_count, chunk_count, error} (in flight or failed)
+hash_to_doc_id = {}  # file hash -> document_id, for stored and processing documents
+ingest_pool = None  # ProcessPoolExecutor for PDF ingestion, created on startup
+chat_pool = None  # ThreadPoolExecutor for chat embedding/search, created on startup
+log_listener = None  # QueueListener writing log records, started on startup
 
 # Metadata file path
 METADATA_FILE = os.path.join(config.UPLOAD_DIR, "documents_metadata.json")
 
+# Read/write block size for saving uploads (fewer syscalls than the 16 KiB default)
+UPLOAD_BUFFER_SIZE = 1024 * 1024
+
+# Seconds between background LM Studio connection probes
+LM_STATUS_INTERVAL = 5
+
 
 # Helper functions
+def hash_file_object(f) -> str:
+    """Calculate SHA256 hash of a binary file object from its current position"""
+    if hasattr(hashlib, "file_digest"):
+        # Python 3.11+: read and hash in C without holding the GIL
+        return hashlib.file_digest(f, "sha256").hexdigest()
+    
+    sha256_hash = hashlib.sha256()
+    while True:
+        chunk = f.read(UPLOAD_BUFFER_SIZE)  # SpooledTemporaryFile has no readinto() before 3.11
+        if not chunk:
+            break
+        sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+
 def calculate_file_hash(file_path: str) -> str:
     """Calculate SHA256 hash of a file"""
-    sha256_hash = hashlib.sha256()
     with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+        return hash_file_object(f)
+
+
+def disk_fileno(source) -> Optional[int]:
+    """File descriptor of a source backed by a real file (None for in-memory spools)"""
+    # Relies on SpooledTemporaryFile's private _rolled flag: fileno() on a spool
+    # still in memory would roll it to disk, the copy this path exists to avoid.
+    # Objects without the flag (plain files) are assumed to have a real fileno()
+    if getattr(source, "_rolled", True) is False:
+        return None
+    try:
+        return source.fileno()
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return None
+
+
+def write_and_hash(source, dest_path: str) -> str:
+    """
+    Write an upload stream to disk, hashing it in the same pass
+    Uploads already spooled to a temp file are copied in the kernel with
+    os.sendfile and hashed straight from that file
+    
+    Args:
+        source: Binary file object to read from
+        dest_path: Path to write to
+    
+    Returns:
+        SHA256 hex digest of the written bytes
+    """
+    source_fd = disk_fileno(source)
+    if source_fd is not None and hasattr(os, "sendfile"):
+        offset = source.tell()
+        size = os.fstat(source_fd).st_size
+        try:
+            with open(dest_path, "wb") as f:
+                position = offset
+                while position < size:
+                    sent = os.sendfile(f.fileno(), source_fd, position, size - position)
+                    if not sent:
+                        break
+                    position += sent
+            return hash_file_object(source)
+        except OSError:
+            source.seek(offset)  # sendfile can't target regular files here; copy instead
+    
+    # read() rather than readinto(): SpooledTemporaryFile only gained readinto in Python 3.11
+    sha256_hash = hashlib.sha256()
+    with open(dest_path, "wb") as f:
+        while True:
+            chunk = source.read(UPLOAD_BUFFER_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            sha256_hash.update(chunk)
     return sha256_hash.hexdigest()
 
 
 def save_metadata():
-    """Save documents metadata to disk"""
-    with open(METADATA_FILE, "w") as f:
-        json.dump(documents_metadata, f, indent=2)
+    """Save documents metadata to disk (atomically, so a crash can't truncate it)"""
+    app.state.documents_cache_json = None
+    temp_path = METADATA_FILE + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(orjson.dumps(documents_metadata))
+    os.replace(temp_path, METADATA_FILE)
 
 
 def load_metadata():
     """Load documents metadata from disk"""
     global documents_metadata
+    app.state.documents_cache_json = None
     if os.path.exists(METADATA_FILE):
-        with open(METADATA_FILE, "r") as f:
-            documents_metadata = json.load(f)
+        with open(METADATA_FILE, "rb") as f:
+            documents_metadata = orjson.loads(f.read())
+    
+    hash_to_doc_id.clear()
+    for doc_id, metadata in documents_metadata.items():
+        if metadata.get("hash"):
+            hash_to_doc_id[metadata["hash"]] = doc_id
 
 
 def find_duplicate_by_hash(file_hash: str) -> Optional[str]:
-    """Find document ID if file with same hash exists"""
-    for doc_id, metadata in documents_metadata.items():
-        if metadata.get("hash") == file_hash:
-            return doc_id
-    return None
+    """Find document ID if file with same hash exists (or is being processed)"""
+    return hash_to_doc_id.get(file_hash)
+
+
+def forget_hash(file_hash: str, document_id: str):
+    """Remove a document's entry from the hash index"""
+    if hash_to_doc_id.get(file_hash) == document_id:
+        del hash_to_doc_id[file_hash]
+
+
+def remove_vector_store_files(document_id: str):
+    """Delete a document's vector store files from disk"""
+    for ext in (".faiss", ".index", ".json", ".pkl", ".npy"):
+        path = os.path.join(config.VECTOR_STORE_DIR, f"{document_id}{ext}")
+        if os.path.exists(path):
+            os.remove(path)
+
+
+async def process_upload(document_id: str, upload_path: str):
+    """
+    Background job: ingest, chunk, embed and index an uploaded PDF
+    The CPU-heavy pipeline runs in the ingestion process pool
+    
+    Args:
+        document_id: Document identifier
+        upload_path: Path of the saved PDF
+    """
+    job = jobs[document_id]
+    loop = asyncio.get_running_loop()
+    
+    try:
+        logger.info("Processing PDF: %s", job['filename'])
+        
+        page_count, chunk_count = await loop.run_in_executor(
+            ingest_pool, build_document_store, upload_path, config.VECTOR_STORE_DIR, document_id
+        )
+        
+        # Load the saved store into this process and create retriever
+        await loop.run_in_executor(chat_pool, get_retriever, document_id)
+        
+        # Save metadata
+        documents_metadata[document_id] = {
+            "filename": job["filename"],
+            "hash": job["hash"],
+            "upload_date": datetime.now().isoformat(),
+            "page_count": page_count,
+            "chunk_count": chunk_count
+        }
+        save_metadata()
+        
+        # From here the status endpoint serves the document from its metadata
+        jobs.pop(document_id, None)
+        logger.info("Successfully processed %s: %d pages, %d chunks",
+                    job['filename'], page_count, chunk_count)
+    
+    except Exception as e:
+        # Clean up on error
+        if os.path.exists(upload_path):
+            os.remove(upload_path)
+        remove_vector_store_files(document_id)
+        forget_hash(job["hash"], document_id)
+        
+        job.update(status="failed", error=f"Error processing PDF: {str(e)}")
+        logger.error("Failed to process %s: %s", job['filename'], e)
+
+
+def get_retriever(document_id: str) -> RAGRetriever:
+    """
+    Get the retriever for a document, loading its vector store from disk
+    if it is not in the cache
+    
+    Args:
+        document_id: Document identifier (must be in documents_metadata)
+    
+    Returns:
+        RAGRetriever instance
+    """
+    with store_lock:
+        if document_id in retrievers:
+            vector_stores[document_id]  # refresh LRU position
+            return retrievers[document_id]
+    
+    # Load outside the lock so requests for other documents aren't held up
+    store = VectorStore.load(config.VECTOR_STORE_DIR, document_id)
+    
+    with store_lock:
+        if document_id not in retrievers:  # another request may have loaded it
+            vector_stores[document_id] = store
+            retrievers[document_id] = create_retriever(store, memory)
+        return retrievers[document_id]
+
+
+def get_store(document_id: str) -> VectorStore:
+    """Get the vector store for a document (see get_retriever)"""
+    return get_retriever(document_id).vector_store
 
 
 def load_existing_documents():
-    """Load all existing documents on startup"""
+    """Load existing documents on startup (most recent ones, up to the cache size)"""
     load_metadata()
     
-    for doc_id, metadata in documents_metadata.items():
-        try:
-            # Load vector store
-            store = VectorStore.load(config.VECTOR_STORE_DIR, doc_id)
-            vector_stores[doc_id] = store
-            
-            # Create retriever
-            retriever = create_retriever(store, memory)
-            retrievers[doc_id] = retriever
+    recent = sorted(
+        documents_metadata.items(),
+        key=lambda item: item[1].get("upload_date", ""),
+        reverse=True
+    )[:config.MAX_LOADED_DOCUMENTS]
+    
+    if not recent:
+        return
+    
+    # Read the stores from disk in parallel (FAISS and file IO release the GIL)
+    with ThreadPoolExecutor(max_workers=min(32, len(recent))) as executor:
+        futures = [
+            (doc_id, metadata, executor.submit(VectorStore.load, config.VECTOR_STORE_DIR, doc_id))
+            for doc_id, metadata in reversed(recent)
+        ]
+        
+        # Insert oldest first so the newest end up most recently used
+        for doc_id, metadata, future in futures:
+            try:
+                store = future.result()
+            except Exception as e:
+                logger.warning("Failed to load document %s: %s", doc_id, e)
+                continue
             
-            print(f"Loaded document: {metadata['filename']} (ID: {doc_id})")
+            with store_lock:
+                vector_stores[doc_id] = store
+                retrievers[doc_id] = create_retriever(store, memory)
+            logger.info("Loaded document: %s (ID: %s)", metadata['filename'], doc_id)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Route the app's loggers through a queue so request handlers never block
+    on stdout; a background listener thread does the writing
+    The queue is a multiprocessing one so ingestion workers can log through
+    it too (see init_ingest_worker)
+    
+    Returns:
+        Started QueueListener (stop it on shutdown to flush)
+    """
+    log_queue = multiprocessing.get_context("spawn").Queue()
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    
+    logger.handlers = [logging.handlers.QueueHandler(log_queue)]  # replace on restart
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
+
+
+async def monitor_lm_studio():
+    """Probe LM Studio in the background so status endpoints never block on it"""
+    while True:
+        try:
+            connected = await test_connection_async(app.state.http)
         except Exception as e:
-            print(f"Warning: Failed to load document {doc_id}: {e}")
+            # Keep probing: a dead monitor would freeze the reported status
+            logger.error("LM Studio status check failed: %s", e)
+            connected = False
+        if connected != app.state.lm_status["ok"]:
+            logger.info("LM Studio %s", "connected" if connected else "disconnected")
+        app.state.lm_status = {"ok": connected, "ts": time.monotonic()}
+        await asyncio.sleep(LM_STATUS_INTERVAL)
 
 
 @app.on_event("startup")
 async def startup_event():
     """Load existing documents on server startup"""
-    print("=" * 60)
-    print("Starting Drug Information Chatbot API...")
-    print(f"LM Studio endpoint: {config.LM_STUDIO_BASE_URL}")
-    print(f"Embedding model: {config.EMBEDDING_MODEL}")
-    print("=" * 60)
-    print("\nLoading existing documents...")
+    global ingest_pool, chat_pool, log_listener
+    log_listener = setup_logging()
+    # Chat queries embed in this process; load the model before the first one
+    get_embedding_model()
+    # Spawned, not forked: a forked child inherits the parent's torch/OpenMP
+    # thread state and CUDA context, which can deadlock or fail in the child
+    ingest_pool = ProcessPoolExecutor(
+        max_workers=config.INGEST_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_ingest_worker,
+        initargs=(log_listener.queue,)
+    )
+    chat_pool = ThreadPoolExecutor(max_workers=config.CHAT_WORKERS, thread_name_prefix="chat")
+    # One pooled HTTP client for all LM Studio traffic (completions and probes)
+    app.state.http = create_async_http_client()
+    get_llm_client().start_async_client(app.state.http)
+    app.state.lm_monitor = asyncio.create_task(monitor_lm_studio())
+    
+    logger.info("Starting Drug Information Chatbot API...")
+    logger.info("LM Studio endpoint: %s", config.LM_STUDIO_BASE_URL)
+    logger.info("Embedding model: %s", config.EMBEDDING_MODEL)
+    logger.info("Loading existing documents...")
     load_existing_documents()
-    print(f"✓ Successfully loaded {len(vector_stores)} documents")
+    logger.info("Successfully loaded %d of %d documents", len(vector_stores), len(documents_metadata))
     
-    if len(vector_stores) > 0:
-        print("\nAvailable documents:")
+    if len(documents_metadata) > 0:
         for doc_id, metadata in documents_metadata.items():
-            print(f"  - {metadata['filename']} (ID: {doc_id[:8]}...)")
+            logger.info("Available document: %s (ID: %s...)", metadata['filename'], doc_id[:8])
     else:
-        print("\n⚠ No documents found. Upload a PDF to get started!")
-    print("=" * 60)
+        logger.warning("No documents found. Upload a PDF to get started!")
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared HTTP resources and worker processes"""
+    app.state.lm_monitor.cancel()
+    await get_llm_client().aclose()
+    await app.state.http.aclose()
+    if ingest_pool is not None:
+        ingest_pool.shutdown(wait=False)
+    if chat_pool is not None:
+        chat_pool.shutdown(wait=False)
+    if log_listener is not None:
+        log_listener.stop()
 
 
 # Request/Response Models
@@ -137,11 +430,18 @@ class ChatResponse(BaseModel):
 class UploadResponse(BaseModel):
     document_id: str
     filename: str
-    page_count: int
-    chunk_count: int
+    status: str
     message: str
 
 
+class DocumentStatusResponse(BaseModel):
+    document_id: str
+    status: str  # processing | ready | failed
+    page_count: Optional[int] = None
+    chunk_count: Optional[int] = None
+    error: Optional[str] = None
+
+
 class HistoryResponse(BaseModel):
     session_id: str
     messages: List[dict]
@@ -157,7 +457,7 @@ class StatusResponse(BaseModel):
 @app.get("/", response_model=StatusResponse)
 async def root():
     """Health check and status endpoint"""
-    lm_connected = test_connection()
+    lm_connected = app.state.lm_status["ok"]
     
     return StatusResponse(
         status="operational" if lm_connected else "degraded",
@@ -169,7 +469,7 @@ async def root():
 @app.get("/health", response_model=StatusResponse)
 async def health_check():
     """Detailed health check"""
-    lm_connected = test_connection()
+    lm_connected = app.state.lm_status["ok"]
     
     return StatusResponse(
         status="healthy" if lm_connected else "unhealthy",
@@ -178,90 +478,45 @@ async def health_check():
     )
 
 
-@app.post("/upload", response_model=UploadResponse)
-async def upload_pdf(file: UploadFile = File(...)):
+@app.post("/upload", response_model=UploadResponse, status_code=202)
+async def upload_pdf(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
     """
-    Upload and process a PDF file (checks for duplicates)
+    Upload a PDF file and queue it for processing (checks for duplicates)
+    Poll GET /documents/{document_id}/status for completion
     
     Args:
         file: PDF file upload
     
     Returns:
-        Upload response with document ID and processing stats
+        Upload response with document ID and processing status
     """
     # Validate file type
     if not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
     # Save to temporary location first
-    temp_id = str(uuid.uuid4())
+    temp_id = uuid.uuid4().hex
     temp_path = os.path.join(config.UPLOAD_DIR, f"temp_{temp_id}.pdf")
     
     try:
-        with open(temp_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Calculate file hash to check for duplicates
-        file_hash = calculate_file_hash(temp_path)
+        # Save and hash in one pass to check for duplicates
+        loop = asyncio.get_running_loop()
+        file_hash = await loop.run_in_executor(None, write_and_hash, file.file, temp_path)
         
         # Check if file already exists
         existing_doc_id = find_duplicate_by_hash(file_hash)
         if existing_doc_id:
             os.remove(temp_path)  # Remove temp file
-            metadata = documents_metadata[existing_doc_id]
+            existing_name = documents_metadata.get(existing_doc_id, jobs.get(existing_doc_id))['filename']
             raise HTTPException(
                 status_code=409, 
-                detail=f"Duplicate file detected. This file already exists as '{metadata['filename']}'"
+                detail=f"Duplicate file detected. This file already exists as '{existing_name}'"
             )
         
         # Generate document ID and move to permanent location
-        document_id = str(uuid.uuid4())
+        document_id = uuid.uuid4().hex
         upload_path = os.path.join(config.UPLOAD_DIR, f"{document_id}.pdf")
-        shutil.move(temp_path, upload_path)
-        
-        # Process PDF
-        print(f"Processing PDF: {file.filename}")
-        
-        # Ingest
-        pages = ingest_pdf(upload_path)
-        page_count = len(pages)
-        
-        # Chunk
-        chunks = chunk_pages(pages)
-        chunk_count = len(chunks)
-        
-        # Create vector store
-        store = create_vector_store(chunks)
-        
-        # Save vector store
-        store.save(config.VECTOR_STORE_DIR, document_id)
-        
-        # Store in global state
-        vector_stores[document_id] = store
-        
-        # Create retriever
-        retriever = create_retriever(store, memory)
-        retrievers[document_id] = retriever
-        
-        # Save metadata
-        documents_metadata[document_id] = {
-            "filename": file.filename,
-            "hash": file_hash,
-            "upload_date": datetime.now().isoformat(),
-            "page_count": page_count,
-            "chunk_count": chunk_count
-        }
-        save_metadata()
-        
-        print(f"Successfully processed {file.filename}: {page_count} pages, {chunk_count} chunks")
-        
-        return UploadResponse(
-            document_id=document_id,
-            filename=file.filename,
-            page_count=page_count,
-            chunk_count=chunk_count,
-            message="PDF processed successfully"
-        )
+        os.replace(temp_path, upload_path)
     
     except HTTPException:
         raise
@@ -269,10 +524,62 @@ async def upload_pdf(file: UploadFile = File(...)):
         # Clean up on error
         if os.path.exists(temp_path):
             os.remove(temp_path)
-        if 'upload_path' in locals() and os.path.exists(upload_path):
-            os.remove(upload_path)
         
-        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error saving PDF: {str(e)}")
+    
+    # Queue processing; the response is sent before it starts
+    jobs[document_id] = {
+        "status": "processing",
+        "filename": file.filename,
+        "hash": file_hash,
+        "page_count": None,
+        "chunk_count": None,
+        "error": None
+    }
+    hash_to_doc_id[file_hash] = document_id
+    background_tasks.add_task(process_upload, document_id, upload_path)
+    
+    return UploadResponse(
+        document_id=document_id,
+        filename=file.filename,
+        status="processing",
+        message="PDF uploaded, processing started"
+    )
+
+
+@app.get("/documents/{document_id}/status", response_model=DocumentStatusResponse)
+async def document_status(document_id: str):
+    """
+    Get processing status of an uploaded document
+    
+    Args:
+        document_id: Document identifier
+    
+    Returns:
+        Status with page/chunk counts once ready, or the error if it failed
+    """
+    job = jobs.get(document_id)
+    if job is not None:
+        if job["status"] == "failed":
+            del jobs[document_id]  # reported once; a retry is a new upload
+        return DocumentStatusResponse(
+            document_id=document_id,
+            status=job["status"],
+            page_count=job["page_count"],
+            chunk_count=job["chunk_count"],
+            error=job["error"]
+        )
+    
+    if document_id in documents_metadata:
+        metadata = documents_metadata[document_id]
+        return DocumentStatusResponse(
+            document_id=document_id,
+            status="ready",
+            page_count=metadata.get("page_count"),
+            chunk_count=metadata.get("chunk_count")
+        )
+    
+    raise HTTPException(status_code=404, detail="Document not found")
 
 
 @app.post("/chat", response_model=ChatResponse)
@@ -287,15 +594,19 @@ async def chat(request: ChatRequest):
         Chat response with answer and sources
     """
     # Validate document ID
-    if request.document_id not in retrievers:
+    if request.document_id not in documents_metadata:
         raise HTTPException(status_code=404, detail="Document not found. Please upload a PDF first.")
     
     try:
-        # Get retriever
-        retriever = retrievers[request.document_id]
+        # Get retriever (reloads the vector store if it was evicted)
+        retriever = await asyncio.get_running_loop().run_in_executor(
+            chat_pool, get_retriever, request.document_id
+        )
         
-        # Answer question
-        result = retriever.answer_question(request.question, request.session_id)
+        # Answer question; embedding/search run in the bounded chat pool
+        result = await retriever.answer_question_async(
+            request.question, request.session_id, executor=chat_pool
+        )
         
         return ChatResponse(
             answer=result['answer'],
@@ -308,6 +619,40 @@ async def chat(request: ChatRequest):
         raise HTTPException(status_code=500, detail=f"Error generating answer: {str(e)}")
 
 
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Answer a question using RAG, streaming tokens as Server-Sent Events
+    
+    Args:
+        request: Chat request with question, session_id, and document_id
+    
+    Returns:
+        text/event-stream of token events followed by a final 'done' event
+    """
+    # Validate document ID
+    if request.document_id not in documents_metadata:
+        raise HTTPException(status_code=404, detail="Document not found. Please upload a PDF first.")
+    
+    try:
+        retriever = await asyncio.get_running_loop().run_in_executor(
+            chat_pool, get_retriever, request.document_id
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error loading document: {str(e)}")
+    
+    def event_stream():
+        # Sync generator: Starlette iterates it in a worker thread
+        try:
+            for event in retriever.stream_answer(request.question, request.session_id):
+                yield b"data: " + orjson.dumps(event) + b"\n\n"
+        except Exception as e:
+            error = {'type': 'error', 'detail': f"Error generating answer: {str(e)}"}
+            yield b"data: " + orjson.dumps(error) + b"\n\n"
+    
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
 @app.get("/history/{session_id}", response_model=HistoryResponse)
 async def get_history(session_id: str):
     """
@@ -351,23 +696,28 @@ async def list_documents():
     Returns:
         List of documents with details
     """
-    documents = []
-    for doc_id, metadata in documents_metadata.items():
-        documents.append({
-            "document_id": doc_id,
-            "filename": metadata.get("filename", "Unknown"),
-            "upload_date": metadata.get("upload_date", "Unknown"),
-            "page_count": metadata.get("page_count", 0),
-            "chunk_count": metadata.get("chunk_count", 0)
+    # Rebuilt only after an upload or delete
+    if app.state.documents_cache_json is None:
+        documents = sorted(
+            (
+                {
+                    "document_id": doc_id,
+                    "filename": metadata.get("filename", "Unknown"),
+                    "upload_date": metadata.get("upload_date", "Unknown"),
+                    "page_count": metadata.get("page_count", 0),
+                    "chunk_count": metadata.get("chunk_count", 0)
+                }
+                for doc_id, metadata in documents_metadata.items()
+            ),
+            key=itemgetter("upload_date"),
+            reverse=True  # Newest first
+        )
+        app.state.documents_cache_json = orjson.dumps({
+            "documents": documents,
+            "count": len(documents)
         })
     
-    # Sort by upload date (newest first)
-    documents.sort(key=lambda x: x["upload_date"], reverse=True)
-    
-    return {
-        "documents": documents,
-        "count": len(documents)
-    }
+    return Response(content=app.state.documents_cache_json, media_type="application/json")
 
 
 @app.delete("/documents/{document_id}")
@@ -387,13 +737,14 @@ async def delete_document(document_id: str):
     filename = documents_metadata[document_id].get("filename", "Unknown")
     
     # Remove from global state
-    if document_id in vector_stores:
-        del vector_stores[document_id]
-    if document_id in retrievers:
-        del retrievers[document_id]
+    with store_lock:
+        vector_stores.pop(document_id, None)
+        retrievers.pop(document_id, None)
     
     # Delete metadata
-    del documents_metadata[document_id]
+    metadata = documents_metadata.pop(document_id)
+    forget_hash(metadata.get("hash"), document_id)
+    jobs.pop(document_id, None)
     save_metadata()
     
     # Delete PDF file
@@ -402,14 +753,9 @@ async def delete_document(document_id: str):
         os.remove(upload_path)
     
     # Delete vector store files
-    vector_store_path = os.path.join(config.VECTOR_STORE_DIR, f"{document_id}.faiss")
-    metadata_path = os.path.join(config.VECTOR_STORE_DIR, f"{document_id}.pkl")
-    if os.path.exists(vector_store_path):
-        os.remove(vector_store_path)
-    if os.path.exists(metadata_path):
-        os.remove(metadata_path)
+    remove_vector_store_files(document_id)
     
-    print(f"Deleted document: {filename} (ID: {document_id})")
+    logger.info("Deleted document: %s (ID: %s)", filename, document_id)
     
     return {
         "message": f"Document '{filename}' deleted successfully",
@@ -418,10 +764,17 @@ async def delete_document(document_id: str):
 
 
 if __name__ == "__main__":
+    import importlib.util
     import uvicorn
     
-    print("Starting Drug Information Chatbot API...")
-    print(f"LM Studio endpoint: {config.LM_STUDIO_BASE_URL}")
-    print(f"Embedding model: {config.EMBEDDING_MODEL}")
-    
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
+    # One worker: document caches, upload jobs and chat memory live in this
+    # process; ingestion is parallelized by the ingest process pool instead.
+    # uvloop/httptools ship with uvicorn[standard]; fall back when absent
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=8000,
+        log_level="info",
+        loop="uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        http="httptools" if importlib.util.find_spec("httptools") else "h11"
+    )
@@ -3,8 +3,11 @@ Conversation Memory Module - Manages chat history per session
 Implements sliding window memory for context-aware responses
 """
 from typing import List, Dict, Optional
-from collections import defaultdict
+from collections import defaultdict, deque
+from itertools import count, islice
 from datetime import datetime
+import threading
+import cachetools
 import config
 
 
@@ -22,8 +25,18 @@ class ConversationMemory:
             max_history: Maximum number of message pairs to store
         """
         self.max_history = max_history
-        self.sessions = defaultdict(list)
+        # Bounded per-session windows; appending past maxlen evicts the oldest
+        self.sessions = defaultdict(lambda: deque(maxlen=self.max_history * 2))
+        # Same windows pre-formatted for the LLM (role and content only)
+        self.llm_views = {}
         self.session_metadata = {}
+        
+        # History version per session, drawn from one counter so a cleared and
+        # restarted session never reuses a version; keys the formatted cache
+        self._versions = count(1)
+        self.version = {}
+        self._llm_history_cache = cachetools.LRUCache(maxsize=1024)
+        self._llm_history_lock = threading.Lock()
     
     def add_message(self, session_id: str, role: str, content: str):
         """
@@ -41,11 +54,15 @@ class ConversationMemory:
         }
         
         self.sessions[session_id].append(message)
-        
-        # Trim to max history (keep most recent)
-        if len(self.sessions[session_id]) > self.max_history * 2:
-            # Keep last max_history pairs
-            self.sessions[session_id] = self.sessions[session_id][-(self.max_history * 2):]
+        self.llm_views.setdefault(
+            session_id, deque(maxlen=self.max_history * 2)
+        ).append({'role': role, 'content': content})
+        self.version[session_id] = next(self._versions)
+    
+    def _tail(self, session_id: str, count: int) -> List[Dict]:
+        """Return the last `count` messages of a session as a list"""
+        history = self.sessions.get(session_id, ())
+        return list(islice(history, max(0, len(history) - count), None))
     
     def get_history(self, session_id: str, max_messages: Optional[int] = None) -> List[Dict]:
         """
@@ -58,12 +75,10 @@ class ConversationMemory:
         Returns:
             List of message dictionaries
         """
-        history = self.sessions.get(session_id, [])
-        
         if max_messages:
-            return history[-max_messages:]
+            return self._tail(session_id, max_messages)
         
-        return history
+        return list(self.sessions.get(session_id, ()))
     
     def get_last_n_pairs(self, session_id: str, n: int = 5) -> List[Dict]:
         """
@@ -76,8 +91,7 @@ class ConversationMemory:
         Returns:
             List of messages (up to n*2 messages)
         """
-        history = self.sessions.get(session_id, [])
-        return history[-(n * 2):]
+        return self._tail(session_id, n * 2)
     
     def clear_session(self, session_id: str):
         """
@@ -88,6 +102,8 @@ class ConversationMemory:
         """
         if session_id in self.sessions:
             del self.sessions[session_id]
+        self.llm_views.pop(session_id, None)
+        self.version.pop(session_id, None)
         if session_id in self.session_metadata:
             del self.session_metadata[session_id]
     
@@ -130,15 +146,17 @@ class ConversationMemory:
             session_id: Session identifier
         
         Returns:
-            List of message dicts with 'role' and 'content'
-        """
-        history = self.get_last_n_pairs(session_id, self.max_history)
-        
-        # Return in OpenAI format (just role and content)
-        return [
-            {'role': msg['role'], 'content': msg['content']}
-            for msg in history
-        ]
+            List of message dicts with 'role' and 'content' (shared; don't modify)
+        """
+        # Kept in OpenAI format (just role and content) as messages are added;
+        # the list is rebuilt only when the session's history has changed
+        key = (session_id, self.version.get(session_id, 0))
+        with self._llm_history_lock:
+            history = self._llm_history_cache.get(key)
+            if history is None:
+                history = list(self.llm_views.get(session_id, ()))
+                self._llm_history_cache[key] = history
+        return history
 
 
 # Global memory instance
@@ -0,0 +1,111 @@
+"""
+ONNX Encoder Module - Runs the embedding model with ONNX Runtime
+Exports the sentence-transformer once, quantizes it to int8 and encodes
+with tokenizer -> session -> mean pooling, all in numpy
+"""
+import os
+import logging
+from typing import List
+import numpy as np
+import config
+
+try:
+    import onnxruntime as ort
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+except ImportError:  # optimum[onnxruntime] is optional; VectorStore falls back to PyTorch
+    ort = None
+
+logger = logging.getLogger("medquery.onnx")
+
+QUANTIZED_FILE = "model_quantized.onnx"
+
+
+def onnx_available() -> bool:
+    """Whether ONNX Runtime and optimum are installed"""
+    return ort is not None
+
+
+class OnnxEncoder:
+    """
+    int8 ONNX Runtime replacement for SentenceTransformer.encode
+    Mean-pools the token embeddings like the sentence-transformers
+    MiniLM models do
+    """
+    
+    def __init__(self, model_name: str = config.EMBEDDING_MODEL, max_seq_length: int = 256):
+        """
+        Load the quantized model, exporting it on first use
+        
+        Args:
+            model_name: Name of the sentence-transformer model
+            max_seq_length: Tokens per text (longer texts are truncated)
+        """
+        repo_id = model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+        model_dir = os.path.join(config.ONNX_MODEL_DIR, repo_id.replace('/', '--'))
+        if not os.path.exists(os.path.join(model_dir, QUANTIZED_FILE)):
+            self._export(repo_id, model_dir)
+        
+        self.max_seq_length = max_seq_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, QUANTIZED_FILE), providers=['CPUExecutionProvider']
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+    
+    @staticmethod
+    def _export(repo_id: str, model_dir: str):
+        """Export the model to ONNX and quantize it (dynamic int8, AVX-512 VNNI)"""
+        logger.info("Exporting %s to ONNX in %s...", repo_id, model_dir)
+        model = ORTModelForFeatureExtraction.from_pretrained(repo_id, export=True)
+        model.save_pretrained(model_dir)
+        AutoTokenizer.from_pretrained(repo_id).save_pretrained(model_dir)
+        
+        quantizer = ORTQuantizer.from_pretrained(model_dir)
+        quantizer.quantize(
+            save_dir=model_dir,
+            quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+        )
+    
+    def encode(self, texts: List[str], batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        """
+        Create embeddings (same arguments as SentenceTransformer.encode)
+        
+        Args:
+            texts: List of text strings
+            batch_size: Texts per session run
+            show_progress_bar: Accepted for compatibility (ignored)
+            convert_to_numpy: Accepted for compatibility (always numpy)
+            normalize_embeddings: L2-normalize the embeddings
+        
+        Returns:
+            float32 array of shape (len(texts), dimension)
+        """
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            inputs = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors='np'
+            )
+            feed = {name: value.astype(np.int64) for name, value in inputs.items()
+                    if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+            
+            # Mean over real tokens (padding masked out)
+            mask = inputs['attention_mask'][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            batches.append(pooled)
+        
+        if not batches:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        
+        embeddings = np.vstack(batches).astype(np.float32, copy=False)
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
@@ -1,6 +1,8 @@
 """
 System and user prompts for the Drug Information Chatbot
 """
+import re
+from typing import Optional
 
 SYSTEM_PROMPT = """You are a precise drug information assistant. Answer ONLY using the provided context from prescribing information.
 
@@ -14,6 +16,47 @@ Rules:
 
 Be specific and comprehensive within the given context."""
 
+# Closing instruction of every user prompt
+ANSWER_INSTRUCTION = "Answer using only the context above. Always cite with page AND section numbers from the context headers."
+
+# Query types in priority order, each with its keywords (matched as substrings)
+_QUERY_TYPE_KEYWORDS = (
+    ("dose", ('dosage', 'dose', 'how much', 'mg', 'frequency')),
+    ("safety", ('side effect', 'adverse', 'reaction', 'warning')),
+    ("contra", ('contraindication', 'should not', 'avoid', 'cannot')),
+    ("inter", ('interaction', 'drug-drug', 'combine', 'together')),
+)
+
+_QUERY_TYPE_HINTS = {
+    "dose": "\nFor dosage questions, include: dose amount, frequency, route of administration, and special considerations.",
+    "safety": "\nFor safety questions, include: type of reaction, frequency if available, and severity indicators.",
+    "contra": "\nFor contraindication questions, be clear about absolute vs relative contraindications.",
+    "inter": "\nFor interaction questions, specify the mechanism and clinical significance.",
+}
+
+# One pass over the question: the lookahead is tried at every position, and
+# at a given position the alternation prefers the higher-priority type
+_KEYWORD_RE = re.compile(
+    "(?=" + "|".join(
+        f"(?P<{name}>" + "|".join(re.escape(word) for word in words) + ")"
+        for name, words in _QUERY_TYPE_KEYWORDS
+    ) + ")",
+    re.IGNORECASE
+)
+
+_QUERY_TYPE_RANK = {name: rank for rank, (name, _) in enumerate(_QUERY_TYPE_KEYWORDS)}
+
+
+def _detect_query_type(question: str) -> Optional[str]:
+    """Return the highest-priority query type whose keywords occur in the question"""
+    best = None
+    for match in _KEYWORD_RE.finditer(question):
+        if best is None or _QUERY_TYPE_RANK[match.lastgroup] < _QUERY_TYPE_RANK[best]:
+            best = match.lastgroup
+            if best == "dose":
+                break
+    return best
+
 
 def create_user_prompt(retrieved_chunks: list, conversation_history: list, question: str) -> str:
     """
@@ -28,51 +71,40 @@ def create_user_prompt(retrieved_chunks: list, conversation_history: list, quest
         Formatted prompt string
     """
     # Detect query type for better instructions
-    question_lower = question.lower()
-    query_type_hint = ""
+    query_type_hint = _QUERY_TYPE_HINTS.get(_detect_query_type(question), "")
     
-    if any(word in question_lower for word in ['dosage', 'dose', 'how much', 'mg', 'frequency']):
-        query_type_hint = "\nFor dosage questions, include: dose amount, frequency, route of administration, and special considerations."
-    elif any(word in question_lower for word in ['side effect', 'adverse', 'reaction', 'warning']):
-        query_type_hint = "\nFor safety questions, include: type of reaction, frequency if available, and severity indicators."
-    elif any(word in question_lower for word in ['contraindication', 'should not', 'avoid', 'cannot']):
-        query_type_hint = "\nFor contraindication questions, be clear about absolute vs relative contraindications."
-    elif any(word in question_lower for word in ['interaction', 'drug-drug', 'combine', 'together']):
-        query_type_hint = "\nFor interaction questions, specify the mechanism and clinical significance."
+    # Assemble the whole prompt in one list and join it once
+    buf = ["Context:\n"]
+    append = buf.append
     
-    # Format retrieved chunks with section information
-    context_parts = []
-    for i, chunk in enumerate(retrieved_chunks, 1):
-        page = chunk.get('metadata', {}).get('page', '?')
-        section = chunk.get('metadata', {}).get('section', '')
-        text = chunk.get('text', '')
+    # Retrieved chunks with section information, blank line between them
+    for i, chunk in enumerate(retrieved_chunks):
+        metadata = chunk.get('metadata', {})
+        page = metadata.get('page', '?')
+        section = metadata.get('section', '')
+        if i:
+            append("\n\n")
         
         # Include section if available
         if section:
-            context_parts.append(f"[Page {page}, Section {section}]\n{text}")
+            append(f"[Page {page}, Section {section}]\n")
         else:
-            context_parts.append(f"[Page {page}]\n{text}")
-    
-    context_text = "\n\n".join(context_parts)
+            append(f"[Page {page}]\n")
+        append(chunk.get('text', ''))
+    append("\n\n")
     
-    # Format conversation history (last 2 only to save space)
-    history_text = ""
+    # Conversation history (last 2 only to save space)
     if conversation_history:
-        recent_history = conversation_history[-2:]  # Only last 2 exchanges
-        history_parts = [f"{msg['role']}: {msg['content']}" for msg in recent_history]
-        history_text = "\n".join(history_parts)
+        append("Recent conversation:\n")
+        for i, msg in enumerate(conversation_history[-2:]):
+            if i:
+                append("\n")
+            append(f"{msg['role']}: {msg['content']}")
+        append("\n\n")
     
-    # Build complete prompt (more concise)
-    history_section = ""
-    if history_text:
-        history_section = f"Recent conversation:\n{history_text}\n\n"
+    append(f"Question: {question}\n{query_type_hint}\n\n")
+    append(ANSWER_INSTRUCTION)
     
-    prompt = f"""Context:
-{context_text}
-
-{history_section}Question: {question}
-{query_type_hint}
-
-Answer using only the context above. Always cite with page AND section numbers from the context headers."""
+    prompt = "".join(buf)
     
     return prompt
@@ -2,13 +2,101 @@
 Retrieval Module - Orchestrates RAG pipeline
 Combines vector search, memory, and LLM generation
 """
-from typing import List, Dict, Optional
-from vectorstore import VectorStore
+import asyncio
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import partial
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from vectorstore import VectorStore, top_k_positions
 from memory import ConversationMemory
 from llm_client import LMStudioClient, get_llm_client
 from prompts import SYSTEM_PROMPT, create_user_prompt
+from chunking import count_tokens
 import config
 
+# Prior messages sent with each question (one user/assistant exchange)
+PROMPT_HISTORY_MESSAGES = 2
+
+# Query-type keywords for re-ranking (substring matches, tested once per query)
+_DOSAGE_QUERY_RE = re.compile(r'dosage|dose|how much|mg')
+_SAFETY_QUERY_RE = re.compile(r'warning|caution|risk|adverse')
+_CONTRAINDICATION_QUERY_RE = re.compile(r'contraindication|should not|cannot')
+
+
+class SearchCoalescer:
+    """
+    Coalesces concurrent searches on one vector store into batched calls
+    The first query starts a batch right away; queries that arrive while it
+    runs are queued and searched together in the next batch, so an idle
+    server adds no latency
+    """
+    
+    def __init__(self, search_batch: Callable[[List[str], int], List[List[Dict]]],
+                 max_batch_size: int = config.SEARCH_BATCH_SIZE):
+        """
+        Initialize coalescer
+        
+        Args:
+            search_batch: Batched search function (queries, top_k) -> results per query
+            max_batch_size: Maximum queries per batched call
+        """
+        self.search_batch = search_batch
+        self.max_batch_size = max_batch_size
+        self._pending = []  # (query, top_k, future)
+        self._draining = False
+    
+    async def search(self, query: str, top_k: int,
+                     executor: Optional[Executor] = None) -> List[Dict]:
+        """
+        Queue a query and wait for its results
+        
+        Args:
+            query: Query string
+            top_k: Number of results to return
+            executor: Thread pool the batched searches run in
+        
+        Returns:
+            Search results for the query
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, top_k, future))
+        
+        if not self._draining:
+            self._draining = True
+            loop.create_task(self._drain(executor))
+        
+        return await future
+    
+    async def _drain(self, executor: Optional[Executor]):
+        """Run queued queries in batches until the queue is empty"""
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                # Batch the queries that share the oldest request's top_k
+                top_k = self._pending[0][1]
+                batch = [item for item in self._pending if item[1] == top_k][:self.max_batch_size]
+                self._pending = [item for item in self._pending if item not in batch]
+                
+                try:
+                    results = await loop.run_in_executor(
+                        executor, self.search_batch, [query for query, _, _ in batch], top_k
+                    )
+                except Exception as e:
+                    for _, _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                
+                for (_, _, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self._draining = False
+
 
 class RAGRetriever:
     """
@@ -31,6 +119,15 @@ class RAGRetriever:
         self.vector_store = vector_store
         self.memory = memory
         self._llm_client = llm_client  # Store the provided client or None
+        
+        # Answer cache: (normalized question, history key) -> (answer, sources, pages)
+        self._answer_cache = OrderedDict()
+        self._answer_cache_lock = threading.Lock()
+        
+        # Batches concurrent async searches (see retrieve_context_async)
+        self._search_coalescer = SearchCoalescer(
+            partial(vector_store.search_rerank_batch, min_similarity=config.SIMILARITY_THRESHOLD)
+        )
     
     @property
     def llm_client(self) -> LMStudioClient:
@@ -39,7 +136,7 @@ class RAGRetriever:
             self._llm_client = get_llm_client()
         return self._llm_client
     
-    def retrieve_context(self, query: str, top_k: int = config.TOP_K_CHUNKS) -> List[Dict]:
+    def retrieve_context(self, query: str, top_k: int = config.TOP_K_CHUNKS) -> Dict:
         """
         Retrieve relevant context chunks for a query with intelligent re-ranking
         
@@ -48,95 +145,171 @@ class RAGRetriever:
             top_k: Number of chunks to retrieve
         
         Returns:
-            List of retrieved chunks with metadata
+            Dictionary with 'chunks' (retrieved chunks with metadata) and
+            'pages' (their sorted unique page numbers, for citations)
+        """
+        query_lower = query.lower()
+        results = self.vector_store.search_rerank(  # Get more candidates
+            query_lower, top_k=top_k * 2, min_similarity=config.SIMILARITY_THRESHOLD
+        )
+        return self._rerank_context(query_lower, results, top_k)
+    
+    async def retrieve_context_async(self, query: str, top_k: int = config.TOP_K_CHUNKS,
+                                     executor: Optional[Executor] = None) -> Dict:
         """
-        results = self.vector_store.search_with_boost(query, top_k=top_k * 2)  # Get more candidates
+        Retrieve context like retrieve_context, batching the vector search
+        with other in-flight requests for the same document
         
-        # Filter by similarity threshold
-        filtered_results = [
-            r for r in results 
-            if r['similarity'] >= config.SIMILARITY_THRESHOLD
-        ]
+        Args:
+            query: User query
+            top_k: Number of chunks to retrieve
+            executor: Thread pool for the batched search (loop default if None)
         
-        # Re-rank based on query type and section relevance
+        Returns:
+            Dictionary with 'chunks' and 'pages', as from retrieve_context
+        """
         query_lower = query.lower()
+        results = await self._search_coalescer.search(query_lower, top_k * 2, executor)
+        return self._rerank_context(query_lower, results, top_k)
+    
+    def _rerank_context(self, query_lower: str, results: List[Dict], top_k: int) -> Dict:
+        """
+        Re-rank search results by query type and collect their pages
+        Results are already filtered by config.SIMILARITY_THRESHOLD in the
+        vector store search
+        """
+        # Re-rank based on query type and section relevance
+        is_dosage = _DOSAGE_QUERY_RE.search(query_lower) is not None
+        is_safety = not is_dosage and _SAFETY_QUERY_RE.search(query_lower) is not None
+        is_contraindication = (not is_dosage and not is_safety and
+                               _CONTRAINDICATION_QUERY_RE.search(query_lower) is not None)
         
-        for result in filtered_results:
+        for result in results:
             section = result.get('metadata', {}).get('section', '').lower()
             
             # Boost dosing sections for dosage questions
-            if any(word in query_lower for word in ['dosage', 'dose', 'how much', 'mg']):
+            if is_dosage:
                 if 'dosage' in section or 'administration' in section or '2.' in section:
                     result['similarity'] += 0.1
             
             # Boost warnings/precautions for safety questions
-            elif any(word in query_lower for word in ['warning', 'caution', 'risk', 'adverse']):
+            elif is_safety:
                 if 'warning' in section or 'adverse' in section or 'precaution' in section:
                     result['similarity'] += 0.1
             
             # Boost contraindications section
-            elif any(word in query_lower for word in ['contraindication', 'should not', 'cannot']):
+            elif is_contraindication:
                 if 'contraindication' in section or '4.' in section:
                     result['similarity'] += 0.1
         
-        # Re-sort by adjusted similarity
-        filtered_results.sort(key=lambda x: x['similarity'], reverse=True)
+        # Select the top_k by adjusted similarity (ties keep search order)
+        similarities = np.fromiter(
+            (r['similarity'] for r in results), dtype=np.float64, count=len(results)
+        )
+        top = top_k_positions(similarities, top_k)
         
-        # Return top_k after re-ranking
-        return filtered_results[:top_k]
+        # Return top_k after re-ranking, with the pages to cite
+        chunks = [results[i] for i in top.tolist()]
+        return {
+            'chunks': chunks,
+            'pages': sorted({chunk['metadata']['page'] for chunk in chunks})
+        }
     
-    def extract_citations(self, chunks: List[Dict]) -> str:
+    def extract_citations(self, pages: List[int]) -> str:
         """
-        Extract page citations from chunks
+        Format page citations
         
         Args:
-            chunks: List of chunk dictionaries
+            pages: Sorted unique page numbers (see retrieve_context)
         
         Returns:
             Formatted citation string
         """
-        pages = sorted(set(chunk['metadata']['page'] for chunk in chunks))
-        
         if len(pages) == 1:
             return f"(Page {pages[0]})"
         elif len(pages) == 2:
             return f"(Pages {pages[0]} and {pages[1]})"
         else:
-            page_list = ", ".join(str(p) for p in pages[:-1])
+            page_list = ", ".join(map(str, pages[:-1]))
             return f"(Pages {page_list}, and {pages[-1]})"
     
-    def generate_answer(self, 
-                       query: str, 
-                       session_id: str,
-                       retrieved_chunks: List[Dict]) -> Dict:
+    def _build_prompt(self, query: str, history: List[Dict],
+                      retrieved_chunks: List[Dict]) -> Tuple[str, List[Dict]]:
         """
-        Generate answer using LLM
+        Build the user prompt and the history messages that precede it
+        
+        History is sent as chat messages ahead of the final user turn (rather
+        than folded into the prompt), and context chunks are ordered by
+        position in the document, so consecutive turns share a stable token
+        prefix that the LLM server can reuse from its KV cache
         
         Args:
             query: User query
-            session_id: Session identifier
+            history: Session history in LLM format (see format_history_for_llm)
             retrieved_chunks: Retrieved context chunks
         
         Returns:
-            Dictionary with answer and metadata
+            (user_prompt, conversation_history)
         """
-        # Get conversation history
-        history = self.memory.get_last_n_pairs(session_id, config.MAX_HISTORY_MESSAGES)
+        # Last exchange only, to stay within the model's context window
+        history = history[-PROMPT_HISTORY_MESSAGES:]
         
-        # Create user prompt
-        user_prompt = create_user_prompt(retrieved_chunks, history, query)
-        
-        # Generate answer
-        answer = self.llm_client.generate_answer(
-            system_prompt=SYSTEM_PROMPT,
-            user_prompt=user_prompt,
-            conversation_history=[]  # History already in user_prompt
+        ordered_chunks = sorted(
+            self._select_context(retrieved_chunks),
+            key=lambda c: (c['metadata'].get('page', 0), c['metadata'].get('chunk_index', 0))
         )
         
+        return create_user_prompt(ordered_chunks, [], query), history
+    
+    def _select_context(self, retrieved_chunks: List[Dict]) -> List[Dict]:
+        """
+        Drop duplicate chunks and cap the context at the token budget
+        
+        Chunks are kept in ranked order, so the least relevant ones are the
+        first to be cut; the best chunk is always kept
+        
+        Args:
+            retrieved_chunks: Retrieved context chunks, best first
+        
+        Returns:
+            Chunks to include in the prompt
+        """
+        selected = []
+        seen_ids = set()
+        seen_texts = set()
+        total_tokens = 0
+        
+        for chunk in retrieved_chunks:
+            # Same chunk, or the same text under another id (whitespace/case aside)
+            chunk_id = chunk.get('chunk_id')
+            text = chunk.get('text', '')
+            text_key = " ".join(text.lower().split())
+            if chunk_id in seen_ids or text_key in seen_texts:
+                continue
+            
+            tokens = count_tokens(text)
+            if selected and total_tokens + tokens > config.CONTEXT_TOKEN_BUDGET:
+                break
+            
+            if chunk_id is not None:
+                seen_ids.add(chunk_id)
+            seen_texts.add(text_key)
+            selected.append(chunk)
+            total_tokens += tokens
+        
+        return selected
+    
+    def _finalize_answer(self,
+                         query: str,
+                         session_id: str,
+                         retrieved_chunks: List[Dict],
+                         pages: List[int],
+                         answer: str) -> Dict:
+        """Attach citations, record the exchange in memory, and build the result"""
         # Extract citations from answer (if LLM included them)
         # Or append citations if not present
         if "(Page" not in answer:
-            citations = self.extract_citations(retrieved_chunks)
+            citations = self.extract_citations(pages)
             answer = f"{answer} {citations}"
         
         # Store in memory
@@ -149,6 +322,131 @@ class RAGRetriever:
             'session_id': session_id
         }
     
+    def _no_context_answer(self, query: str, session_id: str) -> Dict:
+        """Answer used when no relevant context is found"""
+        answer = "This information is not available in the provided prescribing document."
+        self.memory.add_message(session_id, "user", query)
+        self.memory.add_message(session_id, "assistant", answer)
+        
+        return {
+            'answer': answer,
+            'sources': [],
+            'session_id': session_id
+        }
+    
+    def generate_answer(self, 
+                       query: str, 
+                       session_id: str,
+                       retrieved_chunks: List[Dict],
+                       pages: Optional[List[int]] = None,
+                       history: Optional[List[Dict]] = None) -> Dict:
+        """
+        Generate answer using LLM
+        
+        Args:
+            query: User query
+            session_id: Session identifier
+            retrieved_chunks: Retrieved context chunks
+            pages: Their sorted unique page numbers (computed if None)
+            history: Session history in LLM format (fetched if None)
+        
+        Returns:
+            Dictionary with answer and metadata
+        """
+        if history is None:
+            history = self.memory.format_history_for_llm(session_id)
+        user_prompt, history = self._build_prompt(query, history, retrieved_chunks)
+        
+        # Generate answer
+        answer = self.llm_client.generate_answer(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            conversation_history=history
+        )
+        
+        if pages is None:
+            pages = sorted({chunk['metadata']['page'] for chunk in retrieved_chunks})
+        return self._finalize_answer(query, session_id, retrieved_chunks, pages, answer)
+    
+    async def generate_answer_async(self,
+                                    query: str,
+                                    session_id: str,
+                                    retrieved_chunks: List[Dict],
+                                    pages: Optional[List[int]] = None,
+                                    history: Optional[List[Dict]] = None) -> Dict:
+        """
+        Async variant of generate_answer (non-blocking LLM call)
+        
+        Args:
+            query: User query
+            session_id: Session identifier
+            retrieved_chunks: Retrieved context chunks
+            pages: Their sorted unique page numbers (computed if None)
+            history: Session history in LLM format (fetched if None)
+        
+        Returns:
+            Dictionary with answer and metadata
+        """
+        if history is None:
+            history = self.memory.format_history_for_llm(session_id)
+        user_prompt, history = self._build_prompt(query, history, retrieved_chunks)
+        
+        answer = await self.llm_client.generate_answer_async(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            conversation_history=history
+        )
+        
+        if pages is None:
+            pages = sorted({chunk['metadata']['page'] for chunk in retrieved_chunks})
+        return self._finalize_answer(query, session_id, retrieved_chunks, pages, answer)
+    
+    def _lookup_cached_answer(self, query: str, session_id: str,
+                              history: List[Dict]) -> Tuple[Optional[Dict], Tuple]:
+        """
+        Look for a previous answer to the same question asked with the same
+        conversation history
+        Questions must match exactly after normalization (case, whitespace,
+        trailing punctuation): close paraphrases like "adult dose" and
+        "pediatric dose" embed almost identically but need different answers
+        
+        Args:
+            query: User query
+            session_id: Session identifier
+            history: Session history in LLM format (see format_history_for_llm)
+        
+        Returns:
+            (result or None, cache key to pass to _remember_answer)
+        """
+        history = history[-config.MAX_HISTORY_MESSAGES * 2:]
+        history_key = hash(tuple((msg['role'], msg['content']) for msg in history))
+        cache_key = (self._normalize_question(query), history_key)
+        
+        with self._answer_cache_lock:
+            cached = self._answer_cache.get(cache_key)
+            if cached is not None:
+                self._answer_cache.move_to_end(cache_key)
+        
+        if cached is None:
+            return None, cache_key
+        
+        answer, sources, pages = cached
+        return self._finalize_answer(query, session_id, sources, pages, answer), cache_key
+    
+    @staticmethod
+    def _normalize_question(query: str) -> str:
+        """Lowercase a question and collapse its whitespace and trailing punctuation"""
+        return " ".join(query.lower().split()).rstrip(" ?!.")
+    
+    def _remember_answer(self, cache_key: Tuple, result: Dict):
+        """Store a generated answer, evicting the least recently used entry if full"""
+        pages = sorted({chunk['metadata']['page'] for chunk in result['sources']})
+        with self._answer_cache_lock:
+            self._answer_cache[cache_key] = (result['answer'], result['sources'], pages)
+            self._answer_cache.move_to_end(cache_key)
+            if len(self._answer_cache) > config.ANSWER_CACHE_SIZE:
+                self._answer_cache.popitem(last=False)
+    
     def answer_question(self, query: str, session_id: str) -> Dict:
         """
         Complete RAG pipeline: retrieve and generate answer
@@ -160,23 +458,104 @@ class RAGRetriever:
         Returns:
             Dictionary with answer and metadata
         """
+        # Fetched once, for both the answer cache key and the prompt
+        history = self.memory.format_history_for_llm(session_id)
+        cached, cache_key = self._lookup_cached_answer(query, session_id, history)
+        if cached:
+            return cached
+        
         # Retrieve context
-        chunks = self.retrieve_context(query)
+        context = self.retrieve_context(query)
         
-        if not chunks:
+        if not context['chunks']:
             # No relevant context found
-            answer = "This information is not available in the provided prescribing document."
-            self.memory.add_message(session_id, "user", query)
-            self.memory.add_message(session_id, "assistant", answer)
-            
-            return {
-                'answer': answer,
-                'sources': [],
-                'session_id': session_id
-            }
+            return self._no_context_answer(query, session_id)
         
         # Generate answer
-        return self.generate_answer(query, session_id, chunks)
+        result = self.generate_answer(
+            query, session_id, context['chunks'], context['pages'], history
+        )
+        self._remember_answer(cache_key, result)
+        return result
+    
+    async def answer_question_async(self, query: str, session_id: str,
+                                    executor: Optional[Executor] = None) -> Dict:
+        """
+        Async RAG pipeline used by the API server
+        Embedding/search runs in a worker thread; the LLM call is awaited
+        
+        Args:
+            query: User query
+            session_id: Session identifier
+            executor: Thread pool for embedding/search (loop default if None)
+        
+        Returns:
+            Dictionary with answer and metadata
+        """
+        history = self.memory.format_history_for_llm(session_id)
+        cached, cache_key = self._lookup_cached_answer(query, session_id, history)
+        if cached:
+            return cached
+        
+        context = await self.retrieve_context_async(query, executor=executor)
+        
+        if not context['chunks']:
+            return self._no_context_answer(query, session_id)
+        
+        result = await self.generate_answer_async(
+            query, session_id, context['chunks'], context['pages'], history
+        )
+        self._remember_answer(cache_key, result)
+        return result
+    
+    def stream_answer(self, query: str, session_id: str) -> Iterator[Dict]:
+        """
+        RAG pipeline that streams the answer as it is generated
+        
+        Args:
+            query: User query
+            session_id: Session identifier
+        
+        Yields:
+            {'type': 'token', 'content': ...} events while generating, then a
+            final {'type': 'done', 'answer', 'sources', 'session_id'} event
+        """
+        history = self.memory.format_history_for_llm(session_id)
+        cached, cache_key = self._lookup_cached_answer(query, session_id, history)
+        if cached:
+            yield {'type': 'token', 'content': cached['answer']}
+            yield {'type': 'done', **cached}
+            return
+        
+        context = self.retrieve_context(query)
+        chunks = context['chunks']
+        
+        if not chunks:
+            result = self._no_context_answer(query, session_id)
+            yield {'type': 'token', 'content': result['answer']}
+            yield {'type': 'done', **result}
+            return
+        
+        user_prompt, history = self._build_prompt(query, history, chunks)
+        
+        parts = []
+        for delta in self.llm_client.stream_answer(
+            system_prompt=SYSTEM_PROMPT,
+            user_prompt=user_prompt,
+            conversation_history=history
+        ):
+            parts.append(delta)
+            yield {'type': 'token', 'content': delta}
+        
+        streamed = "".join(parts)
+        result = self._finalize_answer(query, session_id, chunks, context['pages'], streamed)
+        
+        # Citations appended after generation still need to reach the client
+        if len(result['answer']) > len(streamed):
+            yield {'type': 'token', 'content': result['answer'][len(streamed):]}
+        
+        self._remember_answer(cache_key, result)
+        yield {'type': 'done', **result}
     
     def get_conversation_history(self, session_id: str) -> List[Dict]:
         """
@@ -44,12 +44,23 @@ def test_upload_pdf():
         
         print(f"✓ Status: {response.status_code}")
         
-        if response.status_code == 200:
-            data = response.json()
-            print(f"✓ Document ID: {data.get('document_id')}")
+        if response.status_code == 202:
+            document_id = response.json().get('document_id')
+            print(f"✓ Document ID: {document_id}")
+            
+            # Processing runs in the background; poll until it finishes
+            data = {'status': 'processing'}
+            while data.get('status') == 'processing':
+                time.sleep(1)
+                data = requests.get(f"{BASE_URL}/documents/{document_id}/status").json()
+            
+            if data.get('status') != 'ready':
+                print(f"❌ Error: {data.get('error')}")
+                return None
+            
             print(f"✓ Pages: {data.get('page_count')}")
             print(f"✓ Chunks: {data.get('chunk_count')}")
-            return data.get('document_id')
+            return document_id
         else:
             print(f"❌ Error: {response.text}")
             return None
@@ -175,10 +186,6 @@ def main():
         print("\n❌ PDF upload failed. Cannot proceed with chat tests.")
         return
     
-    # Wait for processing to complete
-    print("\n⏳ Waiting for processing to complete...")
-    time.sleep(5)
-    
     # Test 4: Chat
     if not test_chat(document_id):
         print("\n❌ Chat tests failed.")
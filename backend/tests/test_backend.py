@@ -3,15 +3,33 @@ Test Suite for Backend Components
 """
 import unittest
 import os
+import io
 import sys
+import asyncio
+import types
+import hashlib
+import tempfile
+import orjson
+from unittest import mock
 
 # Add backend to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from ingest_pdf import ingest_pdf, PDFIngestor
-from chunking import chunk_pages, SmartChunker
-from vectorstore import VectorStore
+from ingest_pdf import ingest_pdf, PDFIngestor, PageContent
+from chunking import chunk_pages, SmartChunker, Chunk
+import numpy as np
+import faiss
+import vectorstore
+from vectorstore import VectorStore, top_k_positions
 from memory import ConversationMemory
+from retrieval import RAGRetriever, SearchCoalescer
+import llm_client
+from llm_client import LMStudioClient
+import fitz
+from fastapi.testclient import TestClient
+import config
+import retrieval
+import main
 
 class TestPDFIngestion(unittest.TestCase):
     """Test PDF ingestion functionality"""
@@ -37,6 +55,17 @@ class TestPDFIngestion(unittest.TestCase):
         pages = ingest_pdf(self.test_pdf)
         has_sections = any(len(page.sections) > 0 for page in pages)
         self.assertTrue(has_sections)
+    
+    def test_table_detection(self):
+        """Test that pages with tables are flagged and narrative pages are not"""
+        pages = ingest_pdf(self.test_pdf)
+        
+        with fitz.open(self.test_pdf) as doc:
+            for page_num in (7, 22, 43):  # dosing, adverse reaction and efficacy tables
+                self.assertGreater(len(doc[page_num].find_tables().tables), 0)
+                self.assertTrue(pages[page_num].has_table)
+            for page_num in (2, 6, 57):  # narrative text only
+                self.assertFalse(pages[page_num].has_table)
 
 
 class TestChunking(unittest.TestCase):
@@ -69,32 +98,63 @@ class TestChunking(unittest.TestCase):
             tokens = chunker.estimate_tokens(chunk.text)
             # Allow some variance
             self.assertLess(tokens, 1000)
+    
+    def test_chunk_overlap(self):
+        """Test that consecutive chunks share trailing sentences"""
+        sentences = [f"Sentence number {i} describes the dosage." for i in range(200)]
+        page = PageContent(
+            page_number=1,
+            text=" ".join(sentences),
+            sections=["2 DOSAGE AND ADMINISTRATION"],
+            has_table=False,
+            document_name="test.pdf"
+        )
+        chunker = SmartChunker(chunk_size=100, overlap=30)
+        chunks = chunker.create_chunks_from_page(page)
+        
+        self.assertGreater(len(chunks), 1)
+        for previous, current in zip(chunks, chunks[1:]):
+            previous_sentences = chunker.split_by_sentences(previous.text)
+            current_sentences = chunker.split_by_sentences(current.text)
+            
+            # Longest run of trailing sentences the next chunk starts with
+            shared = max(
+                k for k in range(len(previous_sentences))
+                if previous_sentences[len(previous_sentences) - k:] == current_sentences[:k]
+            )
+            self.assertGreater(shared, 0)
+            
+            # As many sentences as fit in the overlap budget, and no more
+            overlap_tokens = sum(map(chunker.estimate_tokens, previous_sentences[-shared:]))
+            next_tokens = chunker.estimate_tokens(previous_sentences[-shared - 1])
+            self.assertLessEqual(overlap_tokens, chunker.overlap)
+            self.assertGreater(overlap_tokens + next_tokens, chunker.overlap)
 
 
 class TestVectorStore(unittest.TestCase):
     """Test vector store functionality"""
     
-    def setUp(self):
-        self.test_pdf = os.path.join(
+    @classmethod
+    def setUpClass(cls):
+        # Build the store once; the tests only read from it
+        cls.test_pdf = os.path.join(
             os.path.dirname(__file__), '..', '..', 'rinvoq_pi.pdf'
         )
-        self.pages = ingest_pdf(self.test_pdf)
-        self.chunks = chunk_pages(self.pages)
+        cls.pages = ingest_pdf(cls.test_pdf)
+        cls.chunks = chunk_pages(cls.pages)
+        cls.store = VectorStore()
+        cls.store.build_index(cls.chunks)
     
     def test_vector_store_creation(self):
         """Test vector store creation"""
-        store = VectorStore()
-        store.build_index(self.chunks)
+        store = self.store
         
         self.assertIsNotNone(store.index)
         self.assertEqual(store.index.ntotal, len(self.chunks))
     
     def test_search(self):
         """Test vector search"""
-        store = VectorStore()
-        store.build_index(self.chunks)
-        
-        results = store.search("dosage", top_k=5)
+        results = self.store.search("dosage", top_k=5)
         
         self.assertEqual(len(results), 5)
         self.assertIn('text', results[0])
@@ -102,6 +162,236 @@ class TestVectorStore(unittest.TestCase):
         self.assertIn('similarity', results[0])
 
 
+class TestTopKPositions(unittest.TestCase):
+    """Test top-k selection used to rank search results"""
+    
+    def test_zero_k(self):
+        """Test that k=0 selects nothing"""
+        self.assertEqual(top_k_positions(np.array([3., 1., 2.]), 0).tolist(), [])
+        self.assertEqual(top_k_positions(np.array([2., 2., 2.]), 0).tolist(), [])
+    
+    def test_k_larger_than_scores(self):
+        """Test that k past the array length returns every position, best first"""
+        self.assertEqual(top_k_positions(np.array([3., 1., 2.]), 10).tolist(), [0, 2, 1])
+        self.assertEqual(top_k_positions(np.array([]), 3).tolist(), [])
+    
+    def test_ties_keep_position_order(self):
+        """Test that ties at the cutoff are taken, and ordered, by position"""
+        scores = np.array([1., 5., 3., 5., 3., 3., 0.])
+        self.assertEqual(top_k_positions(scores, 3).tolist(), [1, 3, 2])
+        self.assertEqual(top_k_positions(scores, 4).tolist(), [1, 3, 2, 4])
+        self.assertEqual(
+            top_k_positions(scores, 5).tolist(),
+            np.argsort(-scores, kind='stable')[:5].tolist()
+        )
+
+
+class FakeEncoder:
+    """Embedding model stand-in that looks texts up in a table of vectors"""
+    
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.encoded = []  # every text passed to encode, in order
+    
+    def encode(self, texts, normalize_embeddings=False, **kwargs):
+        self.encoded.extend(texts)
+        return np.stack([self.vectors[text] for text in texts])
+
+
+def clustered_vectors(rng, n, d, centers):
+    """Unit vectors scattered around shared cluster centers"""
+    points = centers[rng.integers(len(centers), size=n)] + 0.3 * rng.standard_normal((n, d))
+    return (points / np.linalg.norm(points, axis=1, keepdims=True)).astype('float32')
+
+
+class SyntheticStoreTestCase(unittest.TestCase):
+    """Base for vector store tests on synthetic vectors (no embedding model)"""
+    
+    DIMENSION = 32
+    
+    def setUp(self):
+        self.rng = np.random.default_rng(0)
+        self.centers = self.rng.standard_normal((50, self.DIMENSION))
+        self.vectors = {}
+        self.encoder = FakeEncoder(self.vectors)
+        patcher = mock.patch.object(
+            vectorstore, "get_embedding_model",
+            lambda model_name=config.EMBEDDING_MODEL: (self.encoder, "cpu")
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+    
+    def make_chunks(self, n):
+        """Chunks whose texts embed to clustered vectors; returns (chunks, vectors)"""
+        vectors = clustered_vectors(self.rng, n, self.DIMENSION, self.centers)
+        chunks = []
+        for i, vector in enumerate(vectors):
+            self.vectors[f"chunk {i}"] = vector
+            chunks.append(Chunk(
+                text=f"chunk {i}",
+                metadata={'page': i // 10 + 1, 'section': "Unknown Section", 'has_table': False},
+                chunk_id=str(i)
+            ))
+        return chunks, vectors
+    
+    def make_queries(self, n):
+        """Query texts that embed near clustered vectors; returns (queries, vectors)"""
+        vectors = clustered_vectors(self.rng, n, self.DIMENSION, self.centers)
+        queries = [f"query {i}" for i in range(n)]
+        self.vectors.update(zip(queries, vectors))
+        return queries, vectors
+    
+    def build_store(self, n):
+        chunks, vectors = self.make_chunks(n)
+        store = VectorStore()
+        store.build_index(chunks)
+        return store, vectors
+    
+    def recall(self, store, vectors, top_k=10, queries=100):
+        """Mean recall@top_k of store.search against an exact IndexFlatIP"""
+        exact = faiss.IndexFlatIP(self.DIMENSION)
+        exact.add(vectors)
+        query_texts, query_vectors = self.make_queries(queries)
+        _, expected = exact.search(query_vectors, top_k)
+        
+        found = 0
+        for text, row in zip(query_texts, expected):
+            ids = {int(r['chunk_id']) for r in store.search(text, top_k=top_k)}
+            found += len(ids & set(row.tolist()))
+        return found / (queries * top_k)
+
+
+class TestVectorStoreIndexes(SyntheticStoreTestCase):
+    """Test the FAISS index variants on synthetic vectors"""
+    
+    def test_sq8_recall(self):
+        """Test that the flat SQ8 index with exact re-ranking matches exact search"""
+        store, vectors = self.build_store(2000)
+        
+        self.assertIsInstance(store._base_index(), faiss.IndexScalarQuantizer)
+        self.assertGreaterEqual(self.recall(store, vectors), 0.98)
+    
+    def test_ivfpq_recall(self):
+        """Test that the IVF-PQ FastScan index with exact re-ranking keeps high recall"""
+        with mock.patch.object(config, "ANN_MIN_VECTORS", 1000):
+            store, vectors = self.build_store(5000)
+        
+        self.assertIsInstance(store._base_index(), faiss.IndexIVFPQFastScan)
+        self.assertGreaterEqual(self.recall(store, vectors), 0.9)
+    
+    def test_save_load_round_trip(self):
+        """Test that a saved store loads memory-mapped and returns the same results"""
+        for n, min_vectors in ((500, 20000), (3000, 1000)):  # SQ8, then IVF-PQ
+            with self.subTest(n=n), mock.patch.object(config, "ANN_MIN_VECTORS", min_vectors):
+                store, _ = self.build_store(n)
+                store.save(self.directory.name, f"doc-{n}")
+                loaded = VectorStore.load(self.directory.name, f"doc-{n}")
+                
+                self.assertIsInstance(loaded.embeddings, np.memmap)
+                self.assertEqual(loaded.index.ntotal, n)
+                queries, _ = self.make_queries(10)
+                for query in queries:
+                    expected = [(r['chunk_id'], r['similarity']) for r in store.search(query, top_k=5)]
+                    actual = [(r['chunk_id'], r['similarity']) for r in loaded.search(query, top_k=5)]
+                    self.assertEqual(actual, expected)
+    
+    def test_legacy_l2_store(self):
+        """Test that a store saved with a bare IndexFlatL2 reports cosine similarities"""
+        chunks, vectors = self.make_chunks(200)
+        index = faiss.IndexFlatL2(self.DIMENSION)
+        index.add(vectors)
+        faiss.write_index(index, os.path.join(self.directory.name, "legacy.index"))
+        with open(os.path.join(self.directory.name, "legacy.json"), "wb") as f:
+            f.write(orjson.dumps({
+                'model_name': config.EMBEDDING_MODEL,
+                'dimension': self.DIMENSION,
+                'texts': [chunk.text for chunk in chunks],
+                'metadatas': [chunk.metadata for chunk in chunks],
+                'chunk_ids': [chunk.chunk_id for chunk in chunks]
+            }))
+        
+        store = VectorStore.load(self.directory.name, "legacy")
+        queries, query_vectors = self.make_queries(5)
+        for query, query_vector in zip(queries, query_vectors):
+            results = store.search(query, top_k=5)
+            cosines = vectors @ query_vector
+            
+            self.assertEqual([int(r['chunk_id']) for r in results],
+                             np.argsort(-cosines)[:5].tolist())
+            for result in results:
+                self.assertAlmostEqual(result['similarity'], cosines[int(result['chunk_id'])], places=4)
+    
+    def test_top_k_larger_than_store(self):
+        """Test that asking for more results than chunks returns every chunk once"""
+        store, _ = self.build_store(5)
+        queries, _ = self.make_queries(1)
+        
+        for results in (store.search(queries[0], top_k=10), store.search_rerank(queries[0], top_k=10)):
+            self.assertEqual(sorted(int(r['chunk_id']) for r in results), list(range(5)))
+
+
+class TestQueryCache(SyntheticStoreTestCase):
+    """Test the per-store cache of search hits"""
+    
+    def setUp(self):
+        super().setUp()
+        self.store, _ = self.build_store(200)
+        self.queries, _ = self.make_queries(3)
+        self.encoder.encoded.clear()
+    
+    def test_repeated_query_not_reencoded(self):
+        """Test that a repeat differing only in case or whitespace is served from cache"""
+        first = self.store.search(self.queries[0], top_k=5)
+        again = self.store.search(f"  {self.queries[0].upper()} ", top_k=5)
+        
+        self.assertEqual(self.encoder.encoded, [self.queries[0]])
+        self.assertEqual([r['chunk_id'] for r in again], [r['chunk_id'] for r in first])
+    
+    def test_batch_encodes_each_new_query_once(self):
+        """Test that a batch only encodes the queries it hasn't seen, once each"""
+        self.store.search(self.queries[0], top_k=5)
+        self.store.search_batch([self.queries[0], self.queries[1], self.queries[1]], top_k=5)
+        
+        self.assertEqual(self.encoder.encoded, [self.queries[0], self.queries[1]])
+    
+    def test_different_top_k_misses(self):
+        """Test that the same query with another top_k is searched again"""
+        self.store.search(self.queries[0], top_k=5)
+        results = self.store.search(self.queries[0], top_k=8)
+        
+        self.assertEqual(self.encoder.encoded, [self.queries[0]] * 2)
+        self.assertEqual(len(results), 8)
+    
+    def test_least_recently_used_evicted(self):
+        """Test that the cache drops the least recently used query when full"""
+        a, b, c = self.queries
+        with mock.patch.object(config, "QUERY_CACHE_SIZE", 2):
+            self.store.search(a, top_k=5)
+            self.store.search(b, top_k=5)
+            self.store.search(a, top_k=5)   # refresh: b is now the oldest
+            self.store.search(c, top_k=5)   # evicts b
+            self.store.search(a, top_k=5)
+            self.store.search(b, top_k=5)
+        
+        self.assertEqual(self.encoder.encoded, [a, b, c, b])
+    
+    def test_new_chunks_clear_cache(self):
+        """Test that rebuilding the index or replacing the chunks empties the cache"""
+        self.store.search(self.queries[0], top_k=5)
+        chunks, _ = self.make_chunks(200)
+        self.store.build_index(chunks)
+        self.encoder.encoded.clear()
+        self.store.search(self.queries[0], top_k=5)
+        
+        self.store._set_chunks(self.store.texts, self.store.metadatas, self.store.chunk_ids.tolist())
+        self.store.search(self.queries[0], top_k=5)
+        
+        self.assertEqual(self.encoder.encoded, [self.queries[0]] * 2)
+
+
 class TestMemory(unittest.TestCase):
     """Test conversation memory functionality"""
     
@@ -142,6 +432,445 @@ class TestMemory(unittest.TestCase):
         self.assertEqual(len(history), 0)
 
 
+class FakeSearchStore:
+    """Vector store stand-in returning one fixed dosing chunk (no embedding model)"""
+    
+    def search_rerank(self, query, top_k, min_similarity=0.0):
+        return [{
+            'chunk_id': 0,
+            'text': "The recommended dosage is 15 mg once daily.",
+            'metadata': {'page': 3, 'section': "2 DOSAGE AND ADMINISTRATION", 'chunk_index': 0},
+            'similarity': 0.8
+        }]
+    
+    def search_rerank_batch(self, queries, top_k, min_similarity=0.0):
+        return [self.search_rerank(query, top_k, min_similarity) for query in queries]
+
+
+class CountingLLMClient:
+    """LLM client stand-in that numbers its answers"""
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def generate_answer(self, system_prompt, user_prompt, conversation_history=None):
+        self.calls += 1
+        return f"Answer {self.calls} (Page 3)"
+    
+    async def generate_answer_async(self, system_prompt, user_prompt, conversation_history=None):
+        return self.generate_answer(system_prompt, user_prompt, conversation_history)
+
+
+class TestAnswerCache(unittest.TestCase):
+    """Test the per-document answer cache in RAGRetriever"""
+    
+    def setUp(self):
+        self.llm = CountingLLMClient()
+        self.memory = ConversationMemory()
+        self.retriever = RAGRetriever(FakeSearchStore(), self.memory, self.llm)
+    
+    def test_repeated_question_hits(self):
+        """Test that the same question with the same history reuses the answer"""
+        first = self.retriever.answer_question("What is the adult dose?", "session-a")
+        second = self.retriever.answer_question("  what is the ADULT dose ", "session-b")
+        
+        self.assertEqual(self.llm.calls, 1)
+        self.assertEqual(second['answer'], first['answer'])
+        self.assertEqual(second['session_id'], "session-b")
+        # The hit is recorded in the asking session's memory
+        self.assertEqual(len(self.memory.get_history("session-b")), 2)
+    
+    def test_different_history_misses(self):
+        """Test that a repeated question after more conversation is answered again"""
+        self.retriever.answer_question("What is the adult dose?", "session-a")
+        self.retriever.answer_question("What is the adult dose?", "session-a")
+        
+        self.assertEqual(self.llm.calls, 2)
+    
+    def test_paraphrase_misses(self):
+        """Test that a near-paraphrase needing a different answer is not served from cache"""
+        self.retriever.answer_question("What is the adult dose?", "session-a")
+        result = self.retriever.answer_question("What is the pediatric dose?", "session-b")
+        
+        self.assertEqual(self.llm.calls, 2)
+        self.assertEqual(result['answer'], "Answer 2 (Page 3)")
+
+
+class TestSearchCoalescer(unittest.TestCase):
+    """Test that coalesced searches reach the right waiters"""
+    
+    def setUp(self):
+        self.batches = []
+    
+    def search_batch(self, queries, top_k):
+        self.batches.append((list(queries), top_k))
+        if "fail" in queries:
+            raise RuntimeError("index unavailable")
+        return [[{'text': f"{query}@{top_k}"}] for query in queries]
+    
+    def test_results_reach_their_waiters(self):
+        """Test that concurrent queries are batched and each gets its own results"""
+        coalescer = SearchCoalescer(self.search_batch, max_batch_size=4)
+        queries = [f"query {i}" for i in range(10)]
+        
+        async def run():
+            return await asyncio.gather(*(coalescer.search(query, 5) for query in queries))
+        
+        results = asyncio.run(run())
+        
+        self.assertEqual([r[0]['text'] for r in results], [f"{q}@5" for q in queries])
+        self.assertLess(len(self.batches), len(queries))
+        self.assertTrue(all(len(batch) <= 4 for batch, _ in self.batches))
+    
+    def test_mixed_top_k(self):
+        """Test that queries are only batched with queries of the same top_k"""
+        coalescer = SearchCoalescer(self.search_batch)
+        requests = [("a", 5), ("b", 10), ("c", 5), ("d", 10), ("e", 5)]
+        
+        async def run():
+            return await asyncio.gather(*(coalescer.search(q, k) for q, k in requests))
+        
+        results = asyncio.run(run())
+        
+        self.assertEqual([r[0]['text'] for r in results], [f"{q}@{k}" for q, k in requests])
+        for batch, top_k in self.batches:
+            self.assertTrue(all(dict(requests)[query] == top_k for query in batch))
+    
+    def test_exception_reaches_batch_waiters(self):
+        """Test that a failed batch raises in its waiters and later batches still run"""
+        coalescer = SearchCoalescer(self.search_batch)
+        
+        async def run():
+            # "first" runs alone; "fail" and "other" are batched while it runs
+            first = asyncio.ensure_future(coalescer.search("first", 5))
+            await asyncio.sleep(0)
+            failed = await asyncio.gather(
+                coalescer.search("fail", 5), coalescer.search("other", 5),
+                return_exceptions=True
+            )
+            after = await coalescer.search("after", 5)
+            return await first, failed, after
+        
+        first, failed, after = asyncio.run(run())
+        
+        self.assertEqual(first[0]['text'], "first@5")
+        self.assertTrue(all(isinstance(result, RuntimeError) for result in failed))
+        self.assertEqual(after[0]['text'], "after@5")
+        self.assertIn((["fail", "other"], 5), self.batches)
+
+
+class TestLoadedDocuments(unittest.TestCase):
+    """Test the LRU of loaded vector stores and their retrievers"""
+    
+    def setUp(self):
+        self.loads = []
+        
+        def load(directory, document_id):
+            self.loads.append(document_id)
+            return FakeSearchStore()
+        
+        with mock.patch.object(config, "MAX_LOADED_DOCUMENTS", 1):
+            stores = main.VectorStoreCache(maxsize=config.MAX_LOADED_DOCUMENTS)
+        metadata = {
+            doc_id: {"filename": f"{doc_id}.pdf", "hash": doc_id, "upload_date": "",
+                     "page_count": 1, "chunk_count": 1}
+            for doc_id in ("doc-a", "doc-b")
+        }
+        for patcher in (
+            mock.patch.object(main, "vector_stores", stores),
+            mock.patch.object(main, "retrievers", {}),
+            mock.patch.object(main, "documents_metadata", metadata),
+            mock.patch.object(main.VectorStore, "load", load),
+            mock.patch.object(retrieval, "get_llm_client", CountingLLMClient),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def test_eviction_drops_retriever(self):
+        """Test that loading a second document unloads the first store and retriever"""
+        main.get_retriever("doc-a")
+        main.get_retriever("doc-b")
+        
+        self.assertEqual(list(main.vector_stores), ["doc-b"])
+        self.assertEqual(list(main.retrievers), ["doc-b"])
+    
+    def test_evicted_document_reloads(self):
+        """Test that an evicted document is reloaded from disk and still answers"""
+        first = main.get_retriever("doc-a")
+        main.get_retriever("doc-b")
+        
+        response = TestClient(main.app).post(
+            "/chat", json={"question": "What is the dose?", "session_id": "s", "document_id": "doc-a"}
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.loads, ["doc-a", "doc-b", "doc-a"])
+        self.assertIsNot(main.retrievers["doc-a"], first)
+        self.assertNotIn("doc-b", main.retrievers)
+    
+    def test_cached_document_not_reloaded(self):
+        """Test that a loaded document is served from memory"""
+        first = main.get_retriever("doc-a")
+        
+        self.assertIs(main.get_retriever("doc-a"), first)
+        self.assertEqual(self.loads, ["doc-a"])
+
+
+class TestDocumentList(unittest.TestCase):
+    """Test that the cached /documents body follows metadata changes"""
+    
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for patcher in (
+            mock.patch.object(main, "documents_metadata", {}),
+            mock.patch.object(main, "hash_to_doc_id", {}),
+            mock.patch.object(main, "METADATA_FILE", os.path.join(directory.name, "metadata.json")),
+            mock.patch.object(config, "UPLOAD_DIR", directory.name),
+            mock.patch.object(config, "VECTOR_STORE_DIR", directory.name),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        main.app.state.documents_cache_json = None
+        self.addCleanup(setattr, main.app.state, "documents_cache_json", None)
+        self.client = TestClient(main.app)
+    
+    def add_document(self, document_id, upload_date):
+        main.documents_metadata[document_id] = {
+            "filename": f"{document_id}.pdf", "hash": document_id, "upload_date": upload_date,
+            "page_count": 1, "chunk_count": 2
+        }
+        main.save_metadata()
+    
+    def listed_ids(self):
+        body = self.client.get("/documents").json()
+        self.assertEqual(body["count"], len(body["documents"]))
+        return [document["document_id"] for document in body["documents"]]
+    
+    def test_list_follows_changes(self):
+        """Test that uploads, deletes and reloads all show up in the list"""
+        self.assertEqual(self.listed_ids(), [])
+        
+        self.add_document("doc-a", "2024-01-01T00:00:00")
+        self.assertEqual(self.listed_ids(), ["doc-a"])
+        
+        self.add_document("doc-b", "2024-02-01T00:00:00")
+        self.assertEqual(self.listed_ids(), ["doc-b", "doc-a"])  # newest first
+        
+        self.assertEqual(self.client.delete("/documents/doc-a").status_code, 200)
+        self.assertEqual(self.listed_ids(), ["doc-b"])
+        
+        main.load_metadata()  # read back what was saved
+        self.assertEqual(self.listed_ids(), ["doc-b"])
+
+
+class FakeCompletionResponse:
+    """requests.Response stand-in for a chat completions reply"""
+    
+    status_code = 200
+    
+    def __init__(self, content: str):
+        self.content = orjson.dumps({"choices": [{"message": {"content": content}}]})
+        self.text = self.content.decode()
+    
+    def raise_for_status(self):
+        pass
+
+
+class TestLLMResponseCache(unittest.TestCase):
+    """Test the exact-payload completion cache in LMStudioClient"""
+    
+    def setUp(self):
+        self.client = LMStudioClient()
+        self.posts = []
+        
+        def post(url, data=None, timeout=None):
+            self.posts.append(orjson.loads(data))
+            return FakeCompletionResponse(f"Reply {len(self.posts)}")
+        
+        self.client._session.post = post
+    
+    def ask(self, question: str) -> str:
+        return self.client.chat_completion([{"role": "user", "content": question}])
+    
+    def test_identical_payload_hits(self):
+        """Test that a repeated request is answered without calling the server"""
+        self.assertEqual(self.ask("What is the dose?"), "Reply 1")
+        self.assertEqual(self.ask("What is the dose?"), "Reply 1")
+        self.assertEqual(len(self.posts), 1)
+    
+    def test_different_payload_misses(self):
+        """Test that any change to the payload reaches the server"""
+        self.ask("What is the dose?")
+        self.ask("What is the dose")
+        self.client.chat_completion([{"role": "user", "content": "What is the dose?"}],
+                                    max_tokens=64)
+        self.assertEqual(len(self.posts), 3)
+    
+    def test_least_recently_used_evicted(self):
+        """Test that the cache drops the least recently used completion when full"""
+        with mock.patch.object(config, "LLM_CACHE_SIZE", 2):
+            self.ask("first")
+            self.ask("second")
+            self.ask("first")   # refresh: "second" is now the oldest
+            self.ask("third")   # evicts "second"
+            self.assertEqual(len(self.posts), 3)
+            
+            self.assertEqual(self.ask("first"), "Reply 1")
+            self.assertEqual(self.ask("second"), "Reply 4")
+        self.assertEqual(len(self.posts), 4)
+
+
+class TestLMStudioMonitor(unittest.TestCase):
+    """Test that the LM Studio probe and monitor survive unexpected errors"""
+    
+    def test_probe_non_http_error(self):
+        """Test that a non-HTTP error from the client counts as disconnected"""
+        class BrokenClient:
+            async def get(self, url, timeout=None):
+                raise ValueError("bad response")
+        
+        self.assertFalse(asyncio.run(llm_client.test_connection_async(BrokenClient())))
+    
+    def test_monitor_keeps_running(self):
+        """Test that the status still updates after a probe raises"""
+        outcomes = [RuntimeError("probe bug"), True, asyncio.CancelledError()]
+        seen = []
+        
+        async def probe(http_client):
+            seen.append(dict(main.app.state.lm_status))
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, BaseException):
+                raise outcome
+            return outcome
+        
+        previous_status = main.app.state.lm_status
+        self.addCleanup(setattr, main.app.state, "lm_status", previous_status)
+        main.app.state.lm_status = {"ok": True, "ts": 0.0}
+        main.app.state.http = None
+        
+        with mock.patch.object(main, "test_connection_async", probe), \
+                mock.patch.object(main, "LM_STATUS_INTERVAL", 0):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(main.monitor_lm_studio())
+        
+        # The failed round was recorded as disconnected, the next as connected
+        self.assertFalse(seen[1]["ok"])
+        self.assertGreater(seen[1]["ts"], 0.0)
+        self.assertTrue(seen[2]["ok"])
+
+
+class ReadOnlyStream(io.RawIOBase):
+    """Binary stream with read() but no readinto(), like SpooledTemporaryFile before 3.11"""
+    
+    def __init__(self, data: bytes):
+        self._buffer = io.BytesIO(data)
+    
+    def readable(self):
+        return True
+    
+    def read(self, size=-1):
+        return self._buffer.read(size)
+    
+    readinto = None
+
+
+class TestUpload(unittest.TestCase):
+    """Test upload writing and hashing"""
+    
+    def setUp(self):
+        doc = fitz.open()
+        page = doc.new_page()
+        page.insert_text((72, 72), "2 DOSAGE AND ADMINISTRATION")
+        self.pdf_bytes = doc.tobytes()
+        doc.close()
+        
+        self.upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.upload_dir.cleanup)
+    
+    def test_write_and_hash_without_readinto(self):
+        """Test that in-memory streams are copied and hashed with read()"""
+        dest_path = os.path.join(self.upload_dir.name, "copy.pdf")
+        file_hash = main.write_and_hash(ReadOnlyStream(self.pdf_bytes), dest_path)
+        
+        self.assertEqual(file_hash, hashlib.sha256(self.pdf_bytes).hexdigest())
+        with open(dest_path, "rb") as f:
+            self.assertEqual(f.read(), self.pdf_bytes)
+    
+    def test_in_memory_spool_not_rolled(self):
+        """Test that a small spooled upload is copied from memory, not rolled to disk"""
+        spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        self.addCleanup(spool.close)
+        spool.write(self.pdf_bytes)
+        spool.seek(0)
+        
+        dest_path = os.path.join(self.upload_dir.name, "spooled.pdf")
+        file_hash = main.write_and_hash(spool, dest_path)
+        
+        self.assertFalse(spool._rolled)
+        self.assertEqual(file_hash, hashlib.sha256(self.pdf_bytes).hexdigest())
+        with open(dest_path, "rb") as f:
+            self.assertEqual(f.read(), self.pdf_bytes)
+    
+    def test_rolled_spool_copied_from_disk(self):
+        """Test that a spool already on disk is copied through its file descriptor"""
+        spool = tempfile.SpooledTemporaryFile(max_size=16)
+        self.addCleanup(spool.close)
+        spool.write(self.pdf_bytes)
+        spool.seek(0)
+        self.assertTrue(spool._rolled)
+        
+        dest_path = os.path.join(self.upload_dir.name, "rolled.pdf")
+        file_hash = main.write_and_hash(spool, dest_path)
+        
+        self.assertEqual(file_hash, hashlib.sha256(self.pdf_bytes).hexdigest())
+        with open(dest_path, "rb") as f:
+            self.assertEqual(f.read(), self.pdf_bytes)
+    
+    def test_hash_file_object_without_readinto(self):
+        """Test hashing a stream that only supports read()"""
+        pre_311_hashlib = types.SimpleNamespace(sha256=hashlib.sha256)  # no file_digest
+        with mock.patch.object(main, "hashlib", pre_311_hashlib):
+            file_hash = main.hash_file_object(ReadOnlyStream(self.pdf_bytes))
+        
+        self.assertEqual(file_hash, hashlib.sha256(self.pdf_bytes).hexdigest())
+    
+    def test_upload_small_pdf(self):
+        """Test that a small PDF (kept in memory by the spool) is saved and hashed"""
+        async def skip_processing(document_id, upload_path):
+            pass
+        
+        with mock.patch.object(config, "UPLOAD_DIR", self.upload_dir.name), \
+                mock.patch.object(main, "process_upload", skip_processing):
+            client = TestClient(main.app)
+            response = client.post(
+                "/upload", files={"file": ("small.pdf", self.pdf_bytes, "application/pdf")}
+            )
+        
+        self.assertEqual(response.status_code, 202)
+        document_id = response.json()["document_id"]
+        job = main.jobs.pop(document_id)
+        main.forget_hash(job["hash"], document_id)
+        
+        self.assertEqual(job["hash"], hashlib.sha256(self.pdf_bytes).hexdigest())
+        with open(os.path.join(self.upload_dir.name, f"{document_id}.pdf"), "rb") as f:
+            self.assertEqual(f.read(), self.pdf_bytes)
+    
+    def test_failed_job_reported_once(self):
+        """Test that a failed job is evicted once its status has been read"""
+        document_id = "failed-job"
+        main.jobs[document_id] = {
+            "status": "failed", "filename": "broken.pdf", "hash": "0" * 64,
+            "page_count": None, "chunk_count": None, "error": "Error processing PDF: broken"
+        }
+        client = TestClient(main.app)
+        
+        response = client.get(f"/documents/{document_id}/status")
+        self.assertEqual(response.json()["status"], "failed")
+        self.assertNotIn(document_id, main.jobs)
+        self.assertEqual(client.get(f"/documents/{document_id}/status").status_code, 404)
+
+
 def run_tests():
     """Run all tests"""
     print("Running Drug Information Chatbot Tests...")
@@ -155,7 +884,17 @@ def run_tests():
     suite.addTests(loader.loadTestsFromTestCase(TestPDFIngestion))
     suite.addTests(loader.loadTestsFromTestCase(TestChunking))
     suite.addTests(loader.loadTestsFromTestCase(TestVectorStore))
+    suite.addTests(loader.loadTestsFromTestCase(TestTopKPositions))
+    suite.addTests(loader.loadTestsFromTestCase(TestVectorStoreIndexes))
+    suite.addTests(loader.loadTestsFromTestCase(TestQueryCache))
     suite.addTests(loader.loadTestsFromTestCase(TestMemory))
+    suite.addTests(loader.loadTestsFromTestCase(TestAnswerCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestSearchCoalescer))
+    suite.addTests(loader.loadTestsFromTestCase(TestLLMResponseCache))
+    suite.addTests(loader.loadTestsFromTestCase(TestLoadedDocuments))
+    suite.addTests(loader.loadTestsFromTestCase(TestDocumentList))
+    suite.addTests(loader.loadTestsFromTestCase(TestLMStudioMonitor))
+    suite.addTests(loader.loadTestsFromTestCase(TestUpload))
     
     # Run tests
     runner = unittest.TextTestRunner(verbosity=2)
@@ -3,14 +3,112 @@ Vector Store Module - Creates and manages FAISS vector store
 Handles embedding generation and similarity search
 """
 import os
+import re
+import sys
+import logging
+import logging.handlers
 import pickle
+import threading
+from collections import OrderedDict
 import numpy as np
+import orjson
 import faiss
+import torch
 from sentence_transformers import SentenceTransformer
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 from chunking import Chunk
+from onnx_encoder import OnnxEncoder, onnx_available
 import config
 
+logger = logging.getLogger("medquery.vectorstore")
+
+faiss.omp_set_num_threads(config.FAISS_OMP_THREADS)
+
+# Query-type keywords for boosting (substring matches, tested once per query)
+_DOSAGE_QUERY_RE = re.compile(r'dosage|dose|mg|administration')
+_SAFETY_QUERY_RE = re.compile(r'warning|contraindication|adverse|risk|safety')
+_BOXED_QUERY_RE = re.compile(r'boxed|black box')
+
+# Boost rules, applied in order: (query pattern, section words, multiplier);
+# None instead of section words matches chunks from pages with a table
+_BOOST_RULES = (
+    (_DOSAGE_QUERY_RE, ('dosage', 'administration'), 1.5),  # dosing sections
+    (_DOSAGE_QUERY_RE, None, 1.3),  # dosage tables
+    (_SAFETY_QUERY_RE, ('warning', 'contraindication', 'adverse'), 1.5),  # warnings
+    (_BOXED_QUERY_RE, ('boxed', 'warning'), 2.0),  # boxed warnings
+)
+
+
+def select_device() -> str:
+    """
+    Pick the device for the embedding model
+    
+    Returns:
+        config.EMBEDDING_DEVICE if set, else 'cuda', 'mps' or 'cpu' by availability
+    """
+    if config.EMBEDDING_DEVICE:
+        return config.EMBEDDING_DEVICE
+    if torch.cuda.is_available():
+        return 'cuda'
+    if torch.backends.mps.is_available():
+        return 'mps'
+    return 'cpu'
+
+
+# Embedding models per model name, with their device; loaded once per process
+_MODEL_CACHE: Dict[str, Tuple[object, str]] = {}
+_MODEL_LOCK = threading.Lock()
+
+
+def get_embedding_model(model_name: str = config.EMBEDDING_MODEL) -> Tuple[object, str]:
+    """
+    Get the shared embedding model, loading it on first use
+    One copy per process: the API server loads it at startup and each
+    ingestion worker in its initializer (see init_ingest_worker)
+    
+    Args:
+        model_name: Name of the sentence-transformer model
+    
+    Returns:
+        (model, device) tuple; the model is an OnnxEncoder or SentenceTransformer
+    """
+    with _MODEL_LOCK:
+        if model_name not in _MODEL_CACHE:
+            if config.EMBEDDING_BACKEND == 'onnx' and onnx_available():
+                _MODEL_CACHE[model_name] = (OnnxEncoder(model_name), 'cpu')
+            else:
+                if config.EMBEDDING_BACKEND == 'onnx':
+                    logger.warning("optimum[onnxruntime] is not installed; using the PyTorch embedding model")
+                device = select_device()
+                _MODEL_CACHE[model_name] = (SentenceTransformer(model_name, device=device), device)
+        return _MODEL_CACHE[model_name]
+
+
+def top_k_positions(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Positions of the k highest scores, best first
+    Only the k-th best score is found by partitioning, and only the
+    selection is sorted; ties are taken and kept in position order, as a
+    stable sort would
+    
+    Args:
+        scores: 1-D array of scores
+        k: Number of positions to return
+    
+    Returns:
+        int array of up to k positions into scores
+    """
+    if k <= 0:
+        return np.arange(0)
+    
+    top = np.arange(len(scores))
+    if len(scores) > k:
+        kth = -np.partition(-scores, k - 1)[k - 1]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)[:k - len(above)]
+        top = np.sort(np.concatenate([above, ties]))
+    return top[np.argsort(-scores[top], kind='stable')]
+
 
 class VectorStore:
     """
@@ -26,23 +124,71 @@ class VectorStore:
             model_name: Name of the sentence-transformer model
         """
         self.model_name = model_name
-        self.model = SentenceTransformer(model_name)
+        self.model, self.device = get_embedding_model(model_name)
+        # Larger corpus batches only pay off on an accelerator
+        self.corpus_batch_size = 32 if self.device == 'cpu' else 128
         self.index = None
-        self.chunks = []
+        # Chunks as aligned columns (text, metadata and id per index position)
+        self.texts = []
+        self.metadatas = []
+        self.chunk_ids = np.array([], dtype=str)
         self.dimension = None
+        # Exact float32 vectors kept for re-ranking when the index is approximate
+        self.embeddings = None
+        # Per-chunk boost rule matches for vectorized boosting (see _section_flags)
+        self.section_flags = None
+        # Search hits per (normalized query, top_k), most recently used last
+        self._query_cache = OrderedDict()
+        self._query_cache_lock = threading.Lock()
     
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+    def encode_corpus(self, texts: List[str]) -> np.ndarray:
         """
-        Create embeddings for a list of texts
+        Create embeddings for a list of document texts
         
         Args:
             texts: List of text strings
         
         Returns:
-            Numpy array of embeddings
+            float32 array of L2-normalized embeddings, one row per text
+        """
+        return self.model.encode(
+            texts,
+            batch_size=self.corpus_batch_size,
+            show_progress_bar=config.SHOW_PROGRESS and sys.stdout.isatty(),
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        ).astype('float32', copy=False)
+    
+    def encode_query(self, query: str) -> np.ndarray:
+        """
+        Create the embedding for a single query
+        
+        Args:
+            query: Query string
+        
+        Returns:
+            L2-normalized, C-contiguous float32 array of shape (1, dimension)
         """
-        embeddings = self.model.encode(texts, show_progress_bar=True)
-        return embeddings
+        return self.encode_queries([query])
+    
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """
+        Create embeddings for a batch of queries in one model call
+        
+        Args:
+            queries: Query strings
+        
+        Returns:
+            L2-normalized, C-contiguous float32 array of shape (len(queries), dimension)
+        """
+        embeddings = self.model.encode(
+            queries,
+            batch_size=32,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        return np.ascontiguousarray(embeddings, dtype='float32')
     
     def build_index(self, chunks: List[Chunk]):
         """
@@ -51,67 +197,245 @@ class VectorStore:
         Args:
             chunks: List of Chunk objects
         """
-        print(f"Building index from {len(chunks)} chunks...")
+        logger.info("Building index from %d chunks...", len(chunks))
         
         # Store chunks
-        self.chunks = chunks
-        
-        # Extract texts
-        texts = [chunk.text for chunk in chunks]
+        self._set_chunks(
+            [chunk.text for chunk in chunks],
+            [chunk.metadata for chunk in chunks],
+            [chunk.chunk_id for chunk in chunks]
+        )
         
-        # Create embeddings
-        embeddings = self.create_embeddings(texts)
+        # Create embeddings (unit length, so inner product is cosine similarity)
+        embeddings = np.ascontiguousarray(self.encode_corpus(self.texts))
         
         # Get dimension
         self.dimension = embeddings.shape[1]
         
-        # Create FAISS index (L2 distance)
-        self.index = faiss.IndexFlatL2(self.dimension)
+        self._create_index(embeddings)
         
-        # Add embeddings to index
-        self.index.add(embeddings.astype('float32'))
+        logger.info("Index built with %d vectors", self.index.ntotal)
+    
+    def _create_index(self, embeddings: np.ndarray):
+        """
+        Create and fill the FAISS index (inner product on normalized vectors)
+        Small corpora use a flat int8 scalar-quantized index; from
+        config.ANN_MIN_VECTORS vectors on, an IVF-PQ FastScan index (4-bit PQ).
+        Candidates from either are re-ranked against the exact float32
+        vectors in search(). The index is wrapped in an IndexIDMap2 holding
+        each vector's chunk position, so FAISS returns positions into the
+        chunk columns directly and vectors can be added or removed by id
         
-        print(f"Index built with {self.index.ntotal} vectors")
+        Args:
+            embeddings: L2-normalized float32 array of shape (N, dimension)
+        """
+        n, d = embeddings.shape
+        
+        if n < config.ANN_MIN_VECTORS:
+            index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+        else:
+            nlist = max(16, int(np.sqrt(n)))
+            m = next(m for m in range(max(1, d // 4), 0, -1) if d % m == 0)
+            
+            quantizer = faiss.IndexFlatIP(d)
+            index = faiss.IndexIVFPQFastScan(quantizer, d, nlist, m, 4, faiss.METRIC_INNER_PRODUCT)
+            index.train(embeddings)
+            index.nprobe = min(nlist, config.ANN_NPROBE)
+        
+        self.index = faiss.IndexIDMap2(index)
+        self.index.add_with_ids(embeddings, np.arange(n, dtype='int64'))
+        self.embeddings = embeddings
+    
+    def _base_index(self):
+        """The index inside the id map (or the index itself for stores saved without one)"""
+        if isinstance(self.index, faiss.IndexIDMap2):
+            return faiss.downcast_index(self.index.index)
+        return self.index
     
-    def search(self, query: str, top_k: int = config.TOP_K_CHUNKS) -> List[Dict]:
+    def _search_index(self, query_embeddings: np.ndarray,
+                      top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Search the index for the most similar chunks, all queries in one call
+        Approximate candidates are re-ranked by exact cosine similarity, and
+        stores saved with the older L2 index have their distances converted
+        (for unit vectors, cosine = 1 - d²/2)
+        
+        Args:
+            query_embeddings: L2-normalized float32 array of shape (n, dimension)
+            top_k: Number of results to return per query
+        
+        Returns:
+            (similarities, indices) arrays per query, best first
+        """
+        if self.embeddings is not None:
+            if isinstance(self._base_index(), faiss.IndexScalarQuantizer):
+                factor = config.SQ8_RERANK_FACTOR
+            else:
+                factor = config.ANN_RERANK_FACTOR
+            _, candidates = self.index.search(query_embeddings, top_k * factor)
+            
+            results = []
+            for query_embedding, row in zip(query_embeddings, candidates):
+                row = row[row >= 0]
+                similarities = self.embeddings[row] @ query_embedding
+                order = np.argsort(-similarities)[:top_k]
+                results.append((similarities[order], row[order]))
+            return results
+        
+        scores, indices = self.index.search(query_embeddings, top_k)
+        if self.index.metric_type == faiss.METRIC_L2:
+            scores = 1 - scores / 2
+        
+        # Drop padding (-1) when the store has fewer vectors than top_k
+        return [(row_scores[row >= 0], row[row >= 0]) for row_scores, row in zip(scores, indices)]
+    
+    def _search_queries(self, queries: List[str],
+                        top_k: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Embed and search queries, serving repeated ones from the query cache
+        Only the queries not in the cache are encoded, as one batch
+        
+        Args:
+            queries: Normalized query strings (stripped and lowercased)
+            top_k: Number of results to return per query
+        
+        Returns:
+            (similarities, indices) arrays per query, as from _search_index()
+        """
+        keys = [(query, top_k) for query in queries]
+        hits = {}
+        with self._query_cache_lock:
+            for key in keys:
+                if key in self._query_cache:
+                    self._query_cache.move_to_end(key)
+                    hits[key] = self._query_cache[key]
+        
+        missing = list(dict.fromkeys(key for key in keys if key not in hits))
+        if missing:
+            found = self._search_index(self.encode_queries([text for text, _ in missing]), top_k)
+            with self._query_cache_lock:
+                for key, hit in zip(missing, found):
+                    hits[key] = self._query_cache[key] = hit
+                    self._query_cache.move_to_end(key)
+                while len(self._query_cache) > config.QUERY_CACHE_SIZE:
+                    self._query_cache.popitem(last=False)
+        
+        return [hits[key] for key in keys]
+    
+    def search(self, query: str, top_k: int = config.TOP_K_CHUNKS,
+               min_similarity: Optional[float] = None) -> List[Dict]:
         """
         Search for similar chunks
         
         Args:
             query: Query string
             top_k: Number of results to return
+            min_similarity: Drop results scoring below this (no filtering if None)
         
         Returns:
-            List of dictionaries with chunk data and similarity scores
+            List of dictionaries with chunk data and cosine similarity scores
+        """
+        return self.search_batch([query], top_k, min_similarity)[0]
+    
+    def search_batch(self, queries: List[str], top_k: int = config.TOP_K_CHUNKS,
+                     min_similarity: Optional[float] = None) -> List[List[Dict]]:
+        """
+        Search for similar chunks for several queries at once
+        Queries are embedded and searched as one batch
+        
+        Args:
+            queries: Query strings
+            top_k: Number of results to return per query
+            min_similarity: Drop results scoring below this (no filtering if None)
+        
+        Returns:
+            One result list per query, as returned by search()
         """
         if self.index is None:
             raise ValueError("Index not built. Call build_index first.")
         
-        # Create query embedding
-        query_embedding = self.model.encode([query])
+        hits = self._search_queries([query.strip().lower() for query in queries], top_k)
         
-        # Search
-        distances, indices = self.index.search(
-            query_embedding.astype('float32'), top_k
-        )
+        return [
+            self._build_results(similarities, indices, np.arange(1, len(indices) + 1), min_similarity)
+            for similarities, indices in hits
+        ]
+    
+    def _build_results(self, similarities: np.ndarray, indices: np.ndarray,
+                       ranks: np.ndarray, min_similarity: Optional[float] = None) -> List[Dict]:
+        """
+        Build result dictionaries for the given chunk positions
+        Candidates below min_similarity are masked out first, so no
+        dictionaries are built for them
+        """
+        if min_similarity is not None:
+            keep = similarities >= min_similarity
+            similarities, indices, ranks = similarities[keep], indices[keep], ranks[keep]
+        
+        texts = self.texts
+        metadatas = self.metadatas
+        return [
+            {
+                'text': texts[idx],
+                'metadata': metadatas[idx],
+                'chunk_id': chunk_id,
+                'similarity': similarity,
+                'rank': rank
+            }
+            for similarity, idx, chunk_id, rank in zip(
+                similarities.tolist(), indices.tolist(),
+                self.chunk_ids[indices].tolist(), ranks.tolist()
+            )
+        ]
+    
+    def _set_chunks(self, texts: List[str], metadatas: List[Dict], chunk_ids: List[str]):
+        """Store the chunk columns and rebuild what is derived from them"""
+        self.texts = texts
+        self.metadatas = metadatas
+        self.chunk_ids = np.array(chunk_ids, dtype=str)
+        self.section_flags = self._section_flags(metadatas)
+        with self._query_cache_lock:
+            self._query_cache.clear()
+    
+    @staticmethod
+    def _section_flags(metadatas: List[Dict]) -> np.ndarray:
+        """
+        Match chunk metadata against the section side of each boost rule
+        Sections don't change after ingestion, so this runs once per store
         
-        # Prepare results
-        results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            chunk = self.chunks[idx]
-            
-            # Convert L2 distance to similarity score (inverse)
-            similarity = 1 / (1 + distance)
-            
-            results.append({
-                'text': chunk.text,
-                'metadata': chunk.metadata,
-                'chunk_id': chunk.chunk_id,
-                'similarity': float(similarity),
-                'rank': i + 1
-            })
+        Args:
+            metadatas: Chunk metadata dictionaries
         
-        return results
+        Returns:
+            bool array of shape (len(metadatas), len(_BOOST_RULES))
+        """
+        flags = np.zeros((len(metadatas), len(_BOOST_RULES)), dtype=bool)
+        for row, metadata in enumerate(metadatas):
+            section = metadata.get('section', '').lower()
+            for col, (_, words, _) in enumerate(_BOOST_RULES):
+                if words is None:
+                    flags[row, col] = bool(metadata.get('has_table'))
+                else:
+                    flags[row, col] = any(word in section for word in words)
+        return flags
+    
+    def _boost_factors(self, section_flags: np.ndarray, query_lower: str) -> np.ndarray:
+        """
+        Compute boost multipliers based on query type and chunk metadata
+        
+        Args:
+            section_flags: Boost rule matches of the chunks (see _section_flags)
+            query_lower: Lowercased query
+        
+        Returns:
+            float64 array of multipliers, one per chunk
+        """
+        factors = np.array([
+            factor if pattern.search(query_lower) else 1.0
+            for pattern, _, factor in _BOOST_RULES
+        ])
+        return np.where(section_flags, factors, 1.0).prod(axis=1)
     
     def boost_results(self, results: List[Dict], query: str) -> List[Dict]:
         """
@@ -124,32 +448,10 @@ class VectorStore:
         Returns:
             Re-ranked results
         """
-        query_lower = query.lower()
+        section_flags = self._section_flags([r['metadata'] for r in results])
         
-        # Boost logic
-        for result in results:
-            boost = 1.0
-            metadata = result['metadata']
-            section = metadata.get('section', '').lower()
-            
-            # Boost dosage tables for dosage questions
-            if any(word in query_lower for word in ['dosage', 'dose', 'mg', 'administration']):
-                if 'dosage' in section or 'administration' in section:
-                    boost *= 1.5
-                if metadata.get('has_table'):
-                    boost *= 1.3
-            
-            # Boost warnings for safety questions
-            if any(word in query_lower for word in ['warning', 'contraindication', 'adverse', 'risk', 'safety']):
-                if 'warning' in section or 'contraindication' in section or 'adverse' in section:
-                    boost *= 1.5
-            
-            # Boost boxed warnings
-            if 'boxed' in query_lower or 'black box' in query_lower:
-                if 'boxed' in section or 'warning' in section:
-                    boost *= 2.0
-            
-            # Apply boost to similarity
+        # Apply boost to similarity
+        for result, boost in zip(results, self._boost_factors(section_flags, query.lower()).tolist()):
             result['similarity'] *= boost
         
         # Re-sort by boosted similarity
@@ -157,20 +459,91 @@ class VectorStore:
         
         return results
     
-    def search_with_boost(self, query: str, top_k: int = config.TOP_K_CHUNKS) -> List[Dict]:
+    def search_with_boost(self, query: str, top_k: int = config.TOP_K_CHUNKS,
+                          min_similarity: Optional[float] = None) -> List[Dict]:
         """
         Search with automatic boosting
+        Boosts are computed on the candidate arrays, so result dictionaries
+        are only built for the chunks that are returned
         
         Args:
             query: Query string
             top_k: Number of results to return
+            min_similarity: Drop results whose boosted score is below this (no filtering if None)
         
         Returns:
             Boosted and re-ranked results
         """
-        results = self.search(query, top_k * 2)  # Get more results for re-ranking
-        results = self.boost_results(results, query)
-        return results[:top_k]
+        return self.search_with_boost_batch([query], top_k, min_similarity)[0]
+    
+    def search_with_boost_batch(self, queries: List[str],
+                                top_k: int = config.TOP_K_CHUNKS,
+                                min_similarity: Optional[float] = None) -> List[List[Dict]]:
+        """
+        Search with automatic boosting for several queries at once
+        Boosts re-rank twice as many candidates as results (see search_rerank_batch)
+        
+        Args:
+            queries: Query strings
+            top_k: Number of results to return per query
+            min_similarity: Drop results whose boosted score is below this (no filtering if None)
+        
+        Returns:
+            One boosted result list per query, as returned by search_with_boost()
+        """
+        return self.search_rerank_batch(queries, top_k, top_k * 2, min_similarity)
+    
+    def search_rerank(self, query: str, top_k: int = config.TOP_K_CHUNKS,
+                      candidates: Optional[int] = None,
+                      min_similarity: Optional[float] = None) -> List[Dict]:
+        """
+        Two-stage search: FAISS recalls a wide candidate set, which is then
+        re-ranked by boosted score in numpy
+        
+        Args:
+            query: Query string
+            top_k: Number of results to return
+            candidates: Candidates recalled from FAISS (top_k * config.RERANK_CANDIDATES if None)
+            min_similarity: Drop results whose boosted score is below this (no filtering if None)
+        
+        Returns:
+            Boosted and re-ranked results
+        """
+        return self.search_rerank_batch([query], top_k, candidates, min_similarity)[0]
+    
+    def search_rerank_batch(self, queries: List[str], top_k: int = config.TOP_K_CHUNKS,
+                            candidates: Optional[int] = None,
+                            min_similarity: Optional[float] = None) -> List[List[Dict]]:
+        """
+        Two-stage search for several queries at once
+        
+        Args:
+            queries: Query strings
+            top_k: Number of results to return per query
+            candidates: Candidates recalled from FAISS per query (top_k * config.RERANK_CANDIDATES if None)
+            min_similarity: Drop results whose boosted score is below this (no filtering if None)
+        
+        Returns:
+            One boosted result list per query, as returned by search_rerank()
+        """
+        if self.index is None:
+            raise ValueError("Index not built. Call build_index first.")
+        
+        if candidates is None:
+            candidates = top_k * config.RERANK_CANDIDATES
+        # Lowercased once, for both the cache key and the query-type rules
+        normalized = [query.strip().lower() for query in queries]
+        hits = self._search_queries(normalized, max(top_k, candidates))
+        
+        results = []
+        for query_lower, (similarities, indices) in zip(normalized, hits):
+            scores = similarities * self._boost_factors(self.section_flags[indices], query_lower)
+            
+            # Best boosted scores first (ties keep search order)
+            top = top_k_positions(scores, top_k)
+            results.append(self._build_results(scores[top], indices[top], top + 1, min_similarity))
+        
+        return results
     
     def save(self, directory: str, document_name: str):
         """
@@ -189,16 +562,22 @@ class VectorStore:
         index_path = os.path.join(directory, f"{safe_name}.index")
         faiss.write_index(self.index, index_path)
         
-        # Save chunks and metadata
-        metadata_path = os.path.join(directory, f"{safe_name}.pkl")
+        # Save exact vectors used to re-rank an approximate index
+        if self.embeddings is not None:
+            np.save(os.path.join(directory, f"{safe_name}.npy"), self.embeddings)
+        
+        # Save chunks (as columns) and metadata
+        metadata_path = os.path.join(directory, f"{safe_name}.json")
         with open(metadata_path, 'wb') as f:
-            pickle.dump({
-                'chunks': self.chunks,
+            f.write(orjson.dumps({
                 'model_name': self.model_name,
-                'dimension': self.dimension
-            }, f)
+                'dimension': self.dimension,
+                'texts': self.texts,
+                'metadatas': self.metadatas,
+                'chunk_ids': self.chunk_ids.tolist()
+            }))
         
-        print(f"Vector store saved to {directory}")
+        logger.info("Vector store saved to %s", directory)
     
     @classmethod
     def load(cls, directory: str, document_name: str):
@@ -223,17 +602,35 @@ class VectorStore:
         if not os.path.exists(index_path):
             index_path = os.path.join(directory, f"{safe_name}.index")
         
-        store.index = faiss.read_index(index_path)
-        
-        # Load chunks and metadata
-        metadata_path = os.path.join(directory, f"{safe_name}.pkl")
-        with open(metadata_path, 'rb') as f:
-            data = pickle.load(f)
-            store.chunks = data['chunks']
-            store.model_name = data['model_name']
-            store.dimension = data['dimension']
+        # Memory-map the index file where FAISS supports it (read-only use)
+        store.index = faiss.read_index(
+            index_path, faiss.IO_FLAG_MMAP | getattr(faiss, 'IO_FLAG_READ_ONLY', 0)
+        )
         
-        print(f"Vector store loaded from {directory}")
+        # Exact vectors for re-ranking (only saved for approximate indexes)
+        embeddings_path = os.path.join(directory, f"{safe_name}.npy")
+        if os.path.exists(embeddings_path):
+            store.embeddings = np.load(embeddings_path, mmap_mode='r')
+        
+        # Load chunks and metadata (stores saved before the JSON format use pickle)
+        metadata_path = os.path.join(directory, f"{safe_name}.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'rb') as f:
+                data = orjson.loads(f.read())
+            store._set_chunks(data['texts'], data['metadatas'], data['chunk_ids'])
+        else:
+            with open(os.path.join(directory, f"{safe_name}.pkl"), 'rb') as f:
+                data = pickle.load(f)
+            chunks = data['chunks']
+            store._set_chunks(
+                [chunk.text for chunk in chunks],
+                [chunk.metadata for chunk in chunks],
+                [chunk.chunk_id for chunk in chunks]
+            )
+        store.model_name = data['model_name']
+        store.dimension = data['dimension']
+        
+        logger.info("Vector store loaded from %s", directory)
         return store
 
 
@@ -252,6 +649,55 @@ def create_vector_store(chunks: List[Chunk]) -> VectorStore:
     return store
 
 
+def build_document_store(pdf_path: str, directory: str, document_id: str) -> Tuple[int, int]:
+    """
+    Run the full ingestion pipeline for a PDF and save its vector store
+    Top-level so it can run in a worker process
+    
+    Args:
+        pdf_path: Path to the PDF file
+        directory: Directory to save the vector store to
+        document_id: Document identifier (used for filenames)
+    
+    Returns:
+        (page_count, chunk_count)
+    """
+    from ingest_pdf import ingest_pdf
+    from chunking import chunk_pages
+    
+    pages = ingest_pdf(pdf_path)
+    chunks = chunk_pages(pages)
+    
+    store = create_vector_store(chunks)
+    store.save(directory, document_id)
+    
+    return len(pages), len(chunks)
+
+
+def init_ingest_worker(log_queue=None):
+    """
+    Initializer for ingestion worker processes
+    Spawned workers inherit nothing from the server, so each loads its own
+    copy of the embedding model once, when it starts
+    
+    Args:
+        log_queue: multiprocessing queue read by the server's log listener;
+            the worker's "medquery" log records are sent there
+    """
+    if log_queue is not None:
+        worker_logger = logging.getLogger("medquery")
+        worker_logger.handlers = [logging.handlers.QueueHandler(log_queue)]
+        worker_logger.setLevel(logging.INFO)
+        worker_logger.propagate = False
+    
+    try:
+        get_embedding_model()
+    except Exception as e:
+        # An initializer that raises breaks the whole pool; leave the load
+        # (and its error) to the job instead
+        logger.warning("Could not preload the embedding model: %s", e)
+
+
 if __name__ == "__main__":
     # Test vector store
     from ingest_pdf import ingest_pdf
@@ -4,6 +4,7 @@
 import axios from 'axios';
 
 const API_BASE_URL = '/api';
+const STATUS_POLL_INTERVAL_MS = 1000;
 
 const api = axios.create({
   baseURL: API_BASE_URL,
@@ -21,7 +22,35 @@ export const checkHealth = async () => {
 };
 
 /**
- * Upload a PDF file
+ * Get processing status of an uploaded document
+ */
+export const getDocumentStatus = async (documentId) => {
+  const response = await api.get(`/documents/${documentId}/status`);
+  return response.data;
+};
+
+/**
+ * Poll until the backend finishes processing an upload
+ */
+const waitForProcessing = async (upload) => {
+  let status = upload;
+
+  while (status.status === 'processing') {
+    await new Promise((resolve) => setTimeout(resolve, STATUS_POLL_INTERVAL_MS));
+    status = await getDocumentStatus(upload.document_id);
+  }
+
+  if (status.status === 'failed') {
+    const error = new Error(status.error);
+    error.response = { data: { detail: status.error } };
+    throw error;
+  }
+
+  return { ...upload, ...status };
+};
+
+/**
+ * Upload a PDF file and wait for it to be processed
  */
 export const uploadPDF = async (file, onProgress) => {
   const formData = new FormData();
@@ -41,7 +70,7 @@ export const uploadPDF = async (file, onProgress) => {
     },
   });
 
-  return response.data;
+  return waitForProcessing(response.data);
 };
 
 /**